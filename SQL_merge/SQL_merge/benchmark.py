@@ -0,0 +1,263 @@
+import os
+import io
+import sys
+import json
+import glob
+import shutil
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from contextlib import redirect_stdout
+
+# resource chỉ có trên Linux/macOS, không có thì bỏ qua peak RSS
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from synthetic_collection import generate_collection
+from merge_excel import merge_sql_csv
+from rpwithchart import generate_report, normalize_formats, DEFAULT_MAPPING, DEFAULT_CHART_MAPPING
+from rules_engine import DEFAULT_RULES
+from stage_timer import stage
+
+# ==================== BENCHMARK ====================
+# Đo thời gian từng stage của pipeline trên collection giả lập (synthetic_collection.py):
+#   csv_read, workbook_write (merge_sql_csv)
+#   workbook_open, sheet_load, rules_eval, table_select, table_budget, chart_render (build_report_model)
+#   template_load, table_build, chart_insert, doc_save, write_<format> (các writer)
+# So với baseline JSON, stage nào chậm hơn quá tolerance thì exit code 1.
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# File đánh dấu workdir do benchmark tạo ra -> chỉ những folder có file này mới được xoá
+WORKDIR_MARKER = ".sql_merge_bench"
+
+# Stage quá nhỏ (vài ms) dao động nhiều, cho phép lệch thêm 1 lượng tuyệt đối
+MIN_SLACK_SEC = 0.05
+MIN_SLACK_MB = 5.0
+
+def run_pipeline(workdir, instances, timings, formats=("docx",), quiet=True):
+    """Chạy merge + report cho tất cả instance, cộng dồn thời gian vào timings."""
+    output_folder = os.path.join(workdir, "output")
+    report_folder = os.path.join(workdir, "reports")
+    os.makedirs(output_folder, exist_ok=True)
+    os.makedirs(report_folder, exist_ok=True)
+
+    sink = io.StringIO() if quiet else sys.stdout
+    with redirect_stdout(sink):
+        for instance in instances:
+            excel_file = os.path.join(output_folder, f"{instance}_healthcheck_info.xlsx")
+            merge_sql_csv(os.path.join(workdir, "input", instance), excel_file, timings=timings)
+
+            template_name = f"SGC_SQL_HEALTHCHECK_{instance}.docx"
+            generate_report(
+                excel_file=excel_file,
+                template_file=os.path.join(workdir, "rptemplate", template_name),
+                output_file=os.path.join(report_folder, template_name),
+                mapping=DEFAULT_MAPPING,
+                chart_mapping=DEFAULT_CHART_MAPPING,
+                rules=DEFAULT_RULES,
+                timings=timings,
+                formats=formats
+            )
+
+def peak_rss_mb():
+    """Peak RSS của process (MB) hoặc None. ru_maxrss tính bằng KB trên Linux, byte trên macOS."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+def measure_memory(workdir, instances):
+    """
+    Peak memory (MB) của phần merge và phần render, chạy riêng 1 lần.
+    tracemalloc chỉ thấy allocation của Python; cây XML của python-docx/lxml nằm trong libxml2 nên
+    ghi thêm process_peak_rss_mb (peak RSS của cả process, gồm cả các lần chạy đo thời gian trước đó).
+    """
+    output_folder = os.path.join(workdir, "output")
+    peaks = {}
+    tracemalloc.start()
+    try:
+        with redirect_stdout(io.StringIO()):
+            for instance in instances:
+                excel_file = os.path.join(output_folder, f"{instance}_healthcheck_info.xlsx")
+                tracemalloc.reset_peak()
+                merge_sql_csv(os.path.join(workdir, "input", instance), excel_file)
+                peaks["merge_peak_mb"] = max(peaks.get("merge_peak_mb", 0.0), tracemalloc.get_traced_memory()[1])
+
+                template_name = f"SGC_SQL_HEALTHCHECK_{instance}.docx"
+                tracemalloc.reset_peak()
+                generate_report(excel_file, os.path.join(workdir, "rptemplate", template_name),
+                                os.path.join(workdir, "reports", template_name),
+                                DEFAULT_MAPPING, DEFAULT_CHART_MAPPING, DEFAULT_RULES)
+                peaks["render_peak_mb"] = max(peaks.get("render_peak_mb", 0.0), tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    result = {k: round(v / 1024 / 1024, 2) for k, v in peaks.items()}
+    rss = peak_rss_mb()
+    if rss is not None:
+        result["process_peak_rss_mb"] = rss
+    return result
+
+def count_csv_rows(workdir, instances):
+    total = 0
+    for instance in instances:
+        for csv_file in glob.glob(os.path.join(workdir, "input", instance, "*.csv")):
+            with open(csv_file, "rb") as f:
+                total += max(sum(1 for _ in f) - 1, 0)
+    return total
+
+def prepare_workdir(workdir):
+    """Xoá workdir cũ nếu do benchmark tạo (có WORKDIR_MARKER); folder lạ còn dữ liệu thì từ chối."""
+    if os.path.exists(workdir):
+        if os.path.exists(os.path.join(workdir, WORKDIR_MARKER)):
+            shutil.rmtree(workdir)
+        elif os.listdir(workdir):
+            raise ValueError(f"Workdir {workdir} không rỗng và không phải do benchmark tạo, không xoá")
+    os.makedirs(workdir, exist_ok=True)
+    with open(os.path.join(workdir, WORKDIR_MARKER), "w", encoding="utf-8") as f:
+        f.write("Tạo bởi benchmark.py, có thể xoá\n")
+
+def run_benchmark(config, workdir, repeat=3, memory=True):
+    prepare_workdir(workdir)
+    placeholders = list(DEFAULT_MAPPING) + list(DEFAULT_CHART_MAPPING)
+    collection_config = {k: v for k, v in config.items() if k != "formats"}
+    instances = generate_collection(workdir, placeholders=placeholders, **collection_config)
+    formats = tuple(config.get("formats", ["docx"]))
+    csv_rows = count_csv_rows(workdir, instances)
+
+    runs = []
+    for i in range(repeat):
+        timings = {}
+        with stage(timings, "total"):
+            run_pipeline(workdir, instances, timings, formats)
+        runs.append(timings)
+        print(f"   ⏱️ run {i + 1}/{repeat}: {timings['total']:.3f}s")
+
+    # Median theo từng stage để giảm nhiễu
+    stages = {name: round(statistics.median(r.get(name, 0.0) for r in runs), 4) for name in runs[0]}
+    merge_sec = stages.get("csv_read", 0.0) + stages.get("workbook_write", 0.0)
+    render_sec = stages["total"] - merge_sec
+
+    result = {
+        "config": config,
+        "repeat": repeat,
+        "stages_sec": stages,
+        "throughput": {
+            "csv_rows_per_sec": round(csv_rows / merge_sec, 1) if merge_sec else None,
+            "reports_per_sec": round(len(instances) / render_sec, 3) if render_sec else None,
+        },
+        "csv_rows": csv_rows,
+    }
+    if memory:
+        result["memory_mb"] = measure_memory(workdir, instances)
+    return result
+
+def compare_with_baseline(result, baseline, tolerance):
+    """Trả về list các regression (chuỗi mô tả), rỗng nếu ổn. Config phải khớp baseline (kiểm tra ở main)."""
+    regressions = []
+    checks = [("stages_sec", "s", MIN_SLACK_SEC), ("memory_mb", "MB", MIN_SLACK_MB)]
+    for section, unit, slack in checks:
+        for name, old in baseline.get(section, {}).items():
+            new = result.get(section, {}).get(name)
+            if new is None:
+                # Stage bị đổi tên / không còn đo -> không so được, coi là lỗi
+                print(f"   ❌ {section}.{name}: không có trong kết quả mới (baseline {old}{unit})")
+                regressions.append(f"{section}.{name}: thiếu trong kết quả mới")
+                continue
+            if not old:
+                continue
+            limit = old * (1 + tolerance) + slack
+            status = "❌" if new > limit else "✅"
+            print(f"   {status} {section}.{name}: {new}{unit} (baseline {old}{unit}, {(new - old) / old:+.0%})")
+            if new > limit:
+                regressions.append(f"{section}.{name}: {new}{unit} > {limit:.3f}{unit}")
+    return regressions
+
+def print_result(result):
+    print(f"\n{'='*60}")
+    print(f" Benchmark config: {result['config']}")
+    print(f"{'='*60}")
+    for name, sec in result["stages_sec"].items():
+        print(f"   {name:<16} {sec:>10.4f}s")
+    for name, value in result["throughput"].items():
+        print(f"   {name:<16} {value}")
+    for name, value in result.get("memory_mb", {}).items():
+        print(f"   {name:<16} {value} MB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark merge_sql_csv + generate_report trên dữ liệu giả lập")
+    parser.add_argument("--instances", type=int, default=2)
+    parser.add_argument("--databases", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=50, help="Số dòng mỗi file CSV")
+    parser.add_argument("--sql-files", type=int, default=10, help="Số file .sql/.sqlplan mỗi sheet query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--formats", default="docx", help="Các format xuất, cách nhau dấu phẩy (docx,xlsx,html,md)")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "sql_merge_bench"),
+                        help="Folder tạm cho collection giả lập (bị xoá và sinh lại mỗi lần chạy, "
+                             "chỉ khi do benchmark tạo ra)")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Ghi kết quả lần này làm baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Cho phép chậm hơn baseline bao nhiêu (0.25 = 25%%)")
+    parser.add_argument("--no-memory", action="store_true", help="Bỏ qua đo peak memory (tracemalloc)")
+    parser.add_argument("--allow-missing-baseline", action="store_true",
+                        help="Không có baseline / config khác baseline thì vẫn exit 0 (mặc định exit 2)")
+    args = parser.parse_args(argv)
+    try:
+        formats = normalize_formats(args.formats)
+    except ValueError as e:
+        parser.error(str(e))
+
+    config = {
+        "instances": args.instances,
+        "databases": args.databases,
+        "rows_per_sheet": args.rows,
+        "sql_files": args.sql_files,
+        "seed": args.seed,
+        "formats": list(formats),
+    }
+    print(f"🚀 Benchmark: {config}")
+    try:
+        result = run_benchmark(config, args.workdir, repeat=args.repeat, memory=not args.no_memory)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    print_result(result)
+
+    with open(os.path.join(args.workdir, "benchmark_result.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n✅ Đã lưu baseline: {args.baseline}")
+        return 0
+
+    missing_status = 0 if args.allow_missing_baseline else 2
+    if not os.path.exists(args.baseline):
+        print(f"\n❌ Chưa có baseline ({args.baseline}). Chạy với --save-baseline để tạo.")
+        return missing_status
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("config") != result["config"]:
+        print(f"\n❌ Config benchmark khác baseline ({baseline.get('config')}), không so sánh được. "
+              "Chạy lại với --save-baseline.")
+        return missing_status
+    print(f"\n📊 So sánh với baseline (tolerance {args.tolerance:.0%}):")
+    regressions = compare_with_baseline(result, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ REGRESSION ({len(regressions)}):")
+        for line in regressions:
+            print(f"   - {line}")
+        return 1
+
+    print("\n✅ Không có regression so với baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,13 +2,10 @@ import os
 import pandas as pd
 import glob
 from name_detect import extract_sheet_name
+from stage_timer import stage
 
-def merge_sql_csv(input_folder, output_file):
-    csv_files = glob.glob(os.path.join(input_folder, "*.csv"))
-    if not csv_files:
-        print(f"⚠️ Không có CSV trong {input_folder}, bỏ qua.\n")
-        return
-
+def read_sql_csv(csv_files):
+    """Đọc các CSV, gom DataFrame theo tên sheet."""
     all_data = {}
 
     for file in csv_files:
@@ -29,13 +26,29 @@ def merge_sql_csv(input_folder, output_file):
             all_data[sheet_name] = []
         all_data[sheet_name].append(df)
 
-    # Xuất Excel
+    return all_data
+
+def write_merged_workbook(all_data, output_file):
+    """Ghép các DataFrame cùng sheet và xuất ra 1 file Excel."""
     with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
         for sheet_name, dfs in all_data.items():
             merged_df = pd.concat(dfs, ignore_index=True)
             merged_df.to_excel(writer, sheet_name=sheet_name, index=False)
             print(f"📝 Đã ghi sheet: {sheet_name} ({len(merged_df)} dòng)")
 
+def merge_sql_csv(input_folder, output_file, timings=None):
+    csv_files = glob.glob(os.path.join(input_folder, "*.csv"))
+    if not csv_files:
+        print(f"⚠️ Không có CSV trong {input_folder}, bỏ qua.\n")
+        return
+
+    with stage(timings, "csv_read"):
+        all_data = read_sql_csv(csv_files)
+
+    # Xuất Excel
+    with stage(timings, "workbook_write"):
+        write_merged_workbook(all_data, output_file)
+
     print(f"✅ Done! File Excel sinh ra: {output_file}\n")
 
 
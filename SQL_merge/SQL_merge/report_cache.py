@@ -0,0 +1,150 @@
+import io
+import os
+import sys
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+# ==================== LRU CACHE THEO DUNG LƯỢNG ====================
+# Dùng chung cho template và sheet DataFrame đã đọc.
+# Giới hạn theo tổng số byte (ước lượng) chứ không theo số phần tử, vì 1 sheet có thể vài KB hoặc vài trăm MB.
+
+def estimate_size(value):
+    """Ước lượng số byte của giá trị được cache."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return sys.getsizeof(value)
+
+class SizedLRUCache:
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()   # key -> (value, size)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, size=None):
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return value  # lớn hơn cả cache thì không giữ
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._items[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._items:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def get_or_load(self, key, loader):
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, loader())
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": len(self._items),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+# ==================== TEMPLATE ====================
+class TemplateCache:
+    """Giữ nội dung template trong RAM (key theo path + mtime), mỗi lần get trả về BytesIO mới cho Document()."""
+
+    def __init__(self, cache=None):
+        self.cache = cache or SizedLRUCache(64 * 1024 * 1024)
+
+    def get(self, path):
+        key = ("template", os.path.abspath(path), os.path.getmtime(path))
+
+        def load():
+            with open(path, "rb") as f:
+                return f.read()
+
+        return io.BytesIO(self.cache.get_or_load(key, load))
+
+# ==================== MAPPING PLAN ====================
+def build_mapping_plan(mapping, chart_mapping=None, rules=None):
+    """Danh sách sheet mà 1 lần generate_report sẽ đọc, để đọc trước 1 lượt (prefetch)."""
+    sheets = set()
+    for config in mapping.values():
+        if config and config.get("sheet"):
+            sheets.add(config["sheet"])
+    if any(config and config.get("findings") for config in mapping.values()):
+        sheets.update(rule["sheet"] for rule in (rules or []))
+    for config in (chart_mapping or {}).values():
+        sheets.add(config["sheet"])
+    return {"sheets": sorted(sheets)}
+
+# ==================== WORKBOOK ====================
+class CachedWorkbook:
+    """
+    Thay cho pd.ExcelFile trong generate_report / evaluate_rules: .sheet_names + .parse(sheet_name),
+    nhưng DataFrame lấy từ cache (key theo path + mtime + sheet). Chỉ mở file Excel khi cache miss.
+    DataFrame trả về được dùng chung giữa các request -> caller không được sửa in-place.
+    File Excel được đóng sau prefetch, để service giữ nhiều instance mà không giữ handle / workbook openpyxl.
+    """
+
+    def __init__(self, path, cache):
+        self.path = os.path.abspath(path)
+        self.cache = cache
+        self.mtime = os.path.getmtime(self.path)
+        self._xls = None
+        self._lock = threading.RLock()  # openpyxl không an toàn khi nhiều thread đọc cùng 1 workbook
+
+    def _excel(self):
+        with self._lock:
+            if self._xls is None:
+                self._xls = pd.ExcelFile(self.path)
+            return self._xls
+
+    def _read(self, sheet_name):
+        with self._lock:
+            return self._excel().parse(sheet_name)
+
+    def _key(self, *parts):
+        return ("sheet", self.path, self.mtime) + parts
+
+    @property
+    def sheet_names(self):
+        return self.cache.get_or_load(self._key("__names__"), lambda: list(self._excel().sheet_names))
+
+    def parse(self, sheet_name):
+        return self.cache.get_or_load(self._key(sheet_name), lambda: self._read(sheet_name))
+
+    def prefetch(self, sheet_names):
+        """Đọc trước các sheet chưa có trong cache (theo mapping plan), xong thì đóng file Excel."""
+        available = set(self.sheet_names)
+        for sheet_name in sheet_names:
+            if sheet_name in available:
+                self.parse(sheet_name)
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._xls is not None:
+                self._xls.close()
+                self._xls = None
@@ -0,0 +1,223 @@
+import io
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from rpwithchart import generate_report, find_templates, DEFAULT_MAPPING, DEFAULT_CHART_MAPPING
+from rules_engine import DEFAULT_RULES
+from report_cache import SizedLRUCache, TemplateCache, CachedWorkbook, build_mapping_plan
+from stage_timer import stage
+
+# ==================== LOCAL REPORT SERVICE ====================
+# HTTP service local bọc generate_report, để tool khác gọi lấy report của 1 instance mà không tốn
+# thời gian khởi động process / parse template / đọc workbook mỗi lần.
+#   GET /report?instance=INS105DCDBCF[&template=SGC_SQL_HEALTHCHECK_INS105DCDBCF.docx] -> file .docx
+#   GET /stats   -> JSON: cache hit/miss/bytes + latency breakdown các request gần nhất
+#   GET /health
+# Latency từng stage của request cũng trả về trong header Server-Timing.
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+SAFE_NAME = re.compile(r"^[\w.\- ]+$")
+CHUNK_SIZE = 64 * 1024
+
+class ReportError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ReportService:
+    def __init__(self, excel_folder, template_folder, cache_mb=512,
+                 mapping=None, chart_mapping=None, rules=None, history=200):
+        self.excel_folder = excel_folder
+        self.template_folder = template_folder
+        self.mapping = mapping or DEFAULT_MAPPING
+        self.chart_mapping = chart_mapping or DEFAULT_CHART_MAPPING
+        self.rules = DEFAULT_RULES if rules is None else rules
+
+        # 1 cache chung cho template + sheet, evict theo tổng dung lượng
+        self.cache = SizedLRUCache(cache_mb * 1024 * 1024)
+        self.templates = TemplateCache(self.cache)
+        self.plan = build_mapping_plan(self.mapping, self.chart_mapping, self.rules)
+
+        self._workbooks = {}
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=history)
+
+    def _workbook(self, excel_file):
+        """CachedWorkbook theo path; file Excel đổi mtime (merge lại) thì tạo mới."""
+        mtime = os.path.getmtime(excel_file)
+        with self._lock:
+            wb = self._workbooks.get(excel_file)
+            if wb is None or wb.mtime != mtime:
+                if wb is not None:
+                    wb.close()
+                wb = CachedWorkbook(excel_file, self.cache)
+                self._workbooks[excel_file] = wb
+            return wb
+
+    def _resolve(self, instance, template=None):
+        if not instance or not SAFE_NAME.match(instance):
+            raise ReportError(400, "Tham số instance không hợp lệ")
+        excel_file = os.path.join(self.excel_folder, f"{instance}_healthcheck_info.xlsx")
+        if not os.path.exists(excel_file):
+            raise ReportError(404, f"Không có file Excel cho {instance}")
+
+        templates = find_templates(self.template_folder, os.path.basename(excel_file))
+        if template:
+            if template not in templates:
+                raise ReportError(404, f"Template {template} không khớp instance {instance}")
+        elif templates:
+            template = templates[0]
+        else:
+            raise ReportError(404, f"Không tìm thấy template cho {instance}")
+        return excel_file, os.path.join(self.template_folder, template)
+
+    def render(self, instance, template=None, timings=None):
+        """Render report vào bộ nhớ, trả về (bytes, tên file)."""
+        timings = {} if timings is None else timings
+        with stage(timings, "resolve"):
+            excel_file, template_file = self._resolve(instance, template)
+        with stage(timings, "prefetch"):
+            workbook = self._workbook(excel_file)
+            workbook.prefetch(self.plan["sheets"])
+
+        output = io.BytesIO()
+        generate_report(
+            excel_file=workbook,
+            template_file=self.templates.get(template_file),
+            output_file=output,
+            mapping=self.mapping,
+            chart_mapping=self.chart_mapping,
+            rules=self.rules,
+            timings=timings
+        )
+        return output.getvalue(), os.path.basename(template_file)
+
+    def record(self, entry):
+        with self._lock:
+            self.recent.append(entry)
+
+    def stats(self):
+        with self._lock:
+            recent = list(self.recent)
+        return {"cache": self.cache.stats(), "workbooks": len(self._workbooks), "requests": recent}
+
+# ==================== HTTP ====================
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer xử lý request bằng thread pool cố định (không mở thread mới cho mỗi request)."""
+
+    def __init__(self, server_address, handler_class, service, workers=4):
+        super().__init__(server_address, handler_class)
+        self.service = service
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self.local = threading.local()
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address, time.perf_counter())
+
+    def _process(self, request, client_address, accepted_at):
+        self.local.accepted_at = accepted_at
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    server_version = "HealthcheckReport/1.0"
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            return self._send_json(200, {"status": "ok"})
+        if url.path == "/stats":
+            return self._send_json(200, self.server.service.stats())
+        if url.path == "/report":
+            return self._report(parse_qs(url.query))
+        return self._send_json(404, {"error": "not found"})
+
+    def _report(self, query):
+        service = self.server.service
+        instance = query.get("instance", [None])[0]
+        template = query.get("template", [None])[0]
+        timings = {"queue_wait": time.perf_counter() - self.server.local.accepted_at}
+        started = time.perf_counter()
+        try:
+            content, filename = service.render(instance, template, timings)
+        except ReportError as e:
+            return self._send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            return self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+        timings["render_total"] = time.perf_counter() - started
+
+        with stage(timings, "send"):
+            self.send_response(200)
+            self.send_header("Content-Type", DOCX_MIME)
+            self.send_header("Content-Length", str(len(content)))
+            self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+            self.send_header("Server-Timing", ", ".join(f"{name};dur={sec * 1000:.1f}"
+                                                         for name, sec in timings.items()))
+            self.end_headers()
+            view = memoryview(content)
+            for offset in range(0, len(content), CHUNK_SIZE):
+                self.wfile.write(view[offset:offset + CHUNK_SIZE])
+
+        service.record({
+            "instance": instance,
+            "template": filename,
+            "bytes": len(content),
+            "timings_ms": {name: round(sec * 1000, 1) for name, sec in timings.items()},
+        })
+
+    def log_message(self, format, *args):
+        print(f"🌐 {self.address_string()} {format % args}")
+
+def serve(service, host="127.0.0.1", port=8765, workers=4):
+    server = PooledHTTPServer((host, port), ReportRequestHandler, service, workers)
+    print(f"🚀 Report service: http://{host}:{server.server_port} ({workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Dừng service")
+    finally:
+        server.server_close()
+
+def main(argv=None):
+    base = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="HTTP service local trả về report healthcheck (.docx) theo instance")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--cache-mb", type=int, default=512, help="Giới hạn RAM cho cache template/sheet")
+    parser.add_argument("--excel-folder", default=os.path.join(base, "output"))
+    parser.add_argument("--template-folder", default=os.path.join(base, "rptemplate"))
+    args = parser.parse_args(argv)
+
+    service = ReportService(args.excel_folder, args.template_folder, cache_mb=args.cache_mb)
+    serve(service, args.host, args.port, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
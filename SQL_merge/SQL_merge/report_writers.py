@@ -0,0 +1,182 @@
+import os
+import io
+import re
+import html
+import base64
+import pandas as pd
+from table_budget import REF_PATTERN, table_parts, appendix_heading
+
+# ==================== REPORT WRITERS ====================
+# Writer nhận model từ rpwithchart.build_report_model và chỉ serialise ra format khác,
+# không đọc lại Excel / không vẽ lại chart. Docx writer nằm ở rpwithchart.write_docx vì cần template.
+# Thêm format mới: viết hàm writer(model, output_file) rồi đăng ký vào WRITERS.
+
+HEADER_COLOR = "#0066CC"
+
+def _slug(text):
+    return re.sub(r"[^\w\-]+", "_", str(text)).strip("_") or "block"
+
+def _cell_text(val):
+    return "" if pd.isna(val) else str(val)
+
+def _ref_target(model):
+    """
+    Đích link cho "[#ref]": anchor trong trang khi appendix inline, file đính kèm khi appendix là attachment,
+    None khi model không có appendix (giữ nguyên text).
+    """
+    for block in model["blocks"]:
+        if block["type"] == "appendix":
+            return block.get("attachment") or "#ref-{ref}"
+    return None
+
+def _link_refs(text, target, template):
+    if target is None:
+        return text
+    return REF_PATTERN.sub(lambda m: template.format(ref=m.group(1), href=target.replace("{ref}", m.group(1))), text)
+
+# ==================== XLSX ====================
+def _unique_sheet_name(title, used):
+    # Excel giới hạn tên sheet 31 ký tự, không có []:*?/\
+    base = re.sub(r"[\[\]:*?/\\]", "_", str(title))[:31] or "Sheet"
+    name, i = base, 2
+    while name.lower() in used:
+        suffix = f" ({i})"
+        name = base[:31 - len(suffix)] + suffix
+        i += 1
+    used.add(name.lower())
+    return name
+
+def write_xlsx(model, output_file):
+    """Mỗi bảng 1 sheet, chart gom vào sheet 'Charts', text vào sheet 'Info'."""
+    from openpyxl.drawing.image import Image
+
+    used = set()
+    with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+        info = [(b["title"], b["text"]) for b in model["blocks"] if b["type"] == "text"]
+        info.append(("Source", model.get("source", "")))
+        pd.DataFrame(info, columns=["Item", "Value"]).to_excel(
+            writer, sheet_name=_unique_sheet_name("Info", used), index=False)
+
+        for block in model["blocks"]:
+            if block["type"] == "table":
+                # Excel không ngại bảng rộng -> ghi nguyên bảng, không tách theo column_groups
+                block["data"].to_excel(writer, sheet_name=_unique_sheet_name(block["title"], used), index=False)
+            elif block["type"] == "appendix":
+                entries = pd.DataFrame(block["entries"], columns=["ref", "table", "column", "text"])
+                entries.columns = ["Ref", "Table", "Column", "Full text"]
+                entries.to_excel(writer, sheet_name=_unique_sheet_name("Appendix", used), index=False)
+
+        charts = [b for b in model["blocks"] if b["type"] == "chart"]
+        if charts:
+            ws = writer.book.create_sheet(_unique_sheet_name("Charts", used))
+            row = 1
+            for block in charts:
+                ws.cell(row=row, column=1, value=block["title"])
+                image = Image(io.BytesIO(block["image"]))
+                # Thu nhỏ về ~ 600px chiều ngang
+                scale = 600 / image.width if image.width > 600 else 1
+                image.width, image.height = image.width * scale, image.height * scale
+                ws.add_image(image, f"A{row + 1}")
+                row += int(image.height / 20) + 3
+
+# ==================== HTML ====================
+HTML_STYLE = f"""
+body {{ font-family: Cambria, Georgia, serif; margin: 2em; color: #222; }}
+table {{ border-collapse: collapse; margin: 0.5em 0 1.5em; font-size: 0.9em; }}
+th {{ background: {HEADER_COLOR}; color: #fff; }}
+th, td {{ border: 1px solid #000; padding: 4px 6px; text-align: left; vertical-align: top; }}
+pre {{ white-space: pre-wrap; font-size: 0.8em; background: #f5f5f5; padding: 6px; }}
+img {{ max-width: 100%; }}
+"""
+
+def write_html(model, output_file):
+    """1 file HTML tự chứa (CSS inline, chart nhúng base64)."""
+    ref_target = _ref_target(model)
+    if ref_target:
+        ref_target = html.escape(ref_target)
+    parts = ["<!DOCTYPE html>", "<html><head><meta charset=\"utf-8\">",
+             f"<title>SQL Server Health Check {html.escape(model['collect_date'])}</title>",
+             f"<style>{HTML_STYLE}</style></head><body>",
+             "<h1>SQL Server Health Check</h1>"]
+
+    for block in model["blocks"]:
+        title = html.escape(str(block["title"]))
+        if block["type"] == "text":
+            parts.append(f"<p><b>{title}:</b> {html.escape(block['text'])}</p>")
+        elif block["type"] == "table":
+            parts.append(f"<h2 id=\"{_slug(block['placeholder'])}\">{title}</h2>")
+            for df, _ in table_parts(block):
+                # Snippet "[#ref]" -> link tới full text trong appendix
+                parts.append(_link_refs(df.to_html(index=False, na_rep="", border=0), ref_target,
+                                        '<a href="{href}">[#{ref}]</a>'))
+            if block.get("note"):
+                parts.append(f"<p><i>{html.escape(block['note'])}</i></p>")
+        elif block["type"] == "appendix":
+            parts.append(f"<h2 id=\"{_slug(block['placeholder'])}\">{title}</h2>")
+            if block.get("attachment"):
+                parts.append(f"<p>Full text: <a href=\"{html.escape(block['attachment'])}\">"
+                             f"{html.escape(block['attachment'])}</a></p>")
+            else:
+                for entry in block["entries"]:
+                    parts.append(f"<h3 id=\"ref-{entry['ref']}\">{html.escape(appendix_heading(entry))}</h3>")
+                    parts.append(f"<pre>{html.escape(entry['text'])}</pre>")
+        elif block["type"] == "chart":
+            encoded = base64.b64encode(block["image"]).decode("ascii")
+            parts.append(f"<h2 id=\"{_slug(block['placeholder'])}\">{title}</h2>")
+            parts.append(f"<img alt=\"{title}\" src=\"data:image/png;base64,{encoded}\">")
+
+    parts.append("</body></html>")
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+
+# ==================== MARKDOWN ====================
+def _md_escape(text):
+    return text.replace("\\", "\\\\").replace("|", "\\|").replace("\r", " ").replace("\n", " ")
+
+def markdown_table(df):
+    header = "| " + " | ".join(_md_escape(str(c)) for c in df.columns) + " |"
+    divider = "|" + "|".join(" --- " for _ in df.columns) + "|"
+    rows = ["| " + " | ".join(_md_escape(_cell_text(v)) for v in row) + " |"
+            for row in df.itertuples(index=False, name=None)]
+    return "\n".join([header, divider] + rows)
+
+def write_markdown(model, output_file):
+    """Markdown cho wiki; chart ghi ra PNG trong folder <tên file>_assets/ cạnh file .md."""
+    base_name = os.path.splitext(output_file)[0]
+    assets_dir = f"{base_name}_assets"
+    ref_target = _ref_target(model)
+    lines = ["# SQL Server Health Check", ""]
+
+    for block in model["blocks"]:
+        if block["type"] == "text":
+            lines += [f"**{block['title']}:** {block['text']}", ""]
+        elif block["type"] == "table":
+            lines += [f"## {block['title']}", ""]
+            for df, _ in table_parts(block):
+                lines += [_link_refs(markdown_table(df), ref_target, "[#{ref}]({href})"), ""]
+            if block.get("note"):
+                lines += [f"*{block['note']}*", ""]
+        elif block["type"] == "appendix":
+            lines += [f"## {block['title']}", ""]
+            if block.get("attachment"):
+                lines += [f"Full text: [{block['attachment']}]({block['attachment']})", ""]
+            else:
+                for entry in block["entries"]:
+                    lines += [f"<a id=\"ref-{entry['ref']}\"></a>", f"### {appendix_heading(entry)}", "",
+                              "```", entry["text"], "```", ""]
+        elif block["type"] == "chart":
+            os.makedirs(assets_dir, exist_ok=True)
+            image_name = f"{_slug(block['placeholder'])}.png"
+            with open(os.path.join(assets_dir, image_name), "wb") as f:
+                f.write(block["image"])
+            lines += [f"## {block['title']}", "",
+                      f"![{block['title']}]({os.path.basename(assets_dir)}/{image_name})", ""]
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+WRITERS = {
+    "xlsx": write_xlsx,
+    "html": write_html,
+    "md": write_markdown,
+}
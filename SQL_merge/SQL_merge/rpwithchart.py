@@ -1,3 +1,4 @@
+import io
 import os
 import pandas as pd
 from docx import Document
@@ -5,9 +6,13 @@ from docx.shared import Pt, RGBColor, Inches
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 from datetime import datetime
-import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from rules_engine import evaluate_rules, summarize_findings, DEFAULT_RULES
+from stage_timer import stage
+from report_writers import WRITERS
+from table_budget import apply_table_budget, table_parts, appendix_heading, appendix_text
 
 # ==================== CELL FORMATTING ====================
 def set_cell_bg(cell, fill_color: str):
@@ -99,7 +104,9 @@ def create_pie_chart(df, title, output_image, label_col_idx=0, value_col_idx=1,
         
         labels, values = zip(*valid_data)
         
-        fig, ax = plt.subplots(figsize=(10, 8), facecolor='white')
+        # Dùng Figure trực tiếp (không qua pyplot) để render chart an toàn khi nhiều thread chạy song song
+        fig = Figure(figsize=(10, 8), facecolor='white')
+        ax = fig.add_subplot()
         colors = ['#5B9BD5', '#ED7D31', '#A5A5A5', '#FFC000', '#70AD47', 
                   '#4472C4', '#C55A11', '#7030A0', '#44546A', '#264478']
         
@@ -119,169 +126,466 @@ def create_pie_chart(df, title, output_image, label_col_idx=0, value_col_idx=1,
         except:
             pass
         
-        plt.axis('equal')
-        plt.tight_layout()
-        plt.savefig(output_image, dpi=150, bbox_inches='tight', facecolor='white')
-        plt.close()
+        ax.axis('equal')
+        fig.tight_layout()
+        fig.savefig(output_image, dpi=150, bbox_inches='tight', facecolor='white')
         
-        print(f"    ✅ Created chart: {output_image}")
+        print(f"    ✅ Created chart: {title}")
         return True
     except Exception as e:
         print(f"   ❌ Error creating chart: {e}")
-        plt.close()
         return False
 
-# ==================== MAIN REPORT GENERATOR ====================
-def generate_report(excel_file: str, template_file: str, output_file: str, mapping: dict, chart_mapping: dict = None):
-    xls = pd.ExcelFile(excel_file)
-    doc = Document(template_file)
-    temp_images = []
+# ==================== TABLE BUILDING ====================
+def select_table_data(df, config):
+    """Chọn cột / transpose / giới hạn dòng theo config của placeholder."""
+    # ==========LOGIC của phần TRANSPOSE==========
+    if config.get("transpose", False):
+        if "columns" in config and config["columns"]:
+            col_indices = config["columns"]
+            selected_cols = [df.columns[i] for i in col_indices if i < len(df.columns)]
+            df = df[selected_cols]
+        
+        original_first_col = df.columns[0]
+        
+        # Transpose: cột thành hàng, hàng thành cột
+        df = df.T.reset_index()
+        
+        if len(df.columns) > 1:
+            new_columns = [original_first_col] + [str(val) for val in df.iloc[0, 1:].tolist()]
+            df.columns = new_columns
+            df = df.iloc[1:].reset_index(drop=True)
+        
+        df = df.loc[:, ~df.columns.str.lower().str.contains('nan', na=False)]
+        df = df.loc[:, df.columns.str.strip() != '']
+    # ====================================
+    else:
+        if "columns" in config and config["columns"]:
+            col_indices = config["columns"]
+            selected = [df.columns[i] for i in col_indices if i < len(df.columns)]
+            df = df[selected]
+
+    max_rows = config.get("max_rows", None)
+    if max_rows and len(df) > max_rows:
+        df = df.head(max_rows)
+
+    return df
+
+def build_table(doc, df, config):
+    """Dựng bảng Word từ df (header màu, text direction, độ rộng cột theo config)."""
+    table = doc.add_table(rows=1, cols=len(df.columns))
+    table.autofit = True
+    set_table_borders(table)
+    
+    hdr_cells = table.rows[0].cells
+    header_height = config.get("header_height", 1.8)
+    set_row_height(table.rows[0], header_height)
+    
+    # ========== TEXT DIRECTION CHO HEADER ==========
+    use_vertical_header = config.get("vertical_header", False)
+    for j, col in enumerate(df.columns):
+        hdr_cells[j].text = str(col)
+        set_cell_bg(hdr_cells[j], "0066CC")
+        format_cell(hdr_cells[j], bold=True, font_color=RGBColor(255, 255, 255))
+        if use_vertical_header:
+            set_cell_text_direction(hdr_cells[j], "tbRl")
+    # ==============================================
+
+    # ========== TEXT DIRECTION CHO BODY CELLS ==========
+    horizontal_columns = config.get("horizontal_columns", [])
+    vertical_body = config.get("vertical_body", False)
+    row_height = config.get("row_height", 1.8)
+    
+    for _, row in df.iterrows():
+        new_row = table.add_row()
+        row_cells = new_row.cells
+        set_row_height(new_row, row_height)
+        
+        for j, val in enumerate(row):
+            row_cells[j].text = str(val)
+            format_cell(row_cells[j])
+            
+            if vertical_body:
+                col_name = df.columns[j]
+                if col_name not in horizontal_columns:
+                    set_cell_text_direction(row_cells[j], "tbRl")
+    # ==================================================
+
+    if "column_widths" in config:
+        col_widths = config["column_widths"]
+        for col_idx, width_cm in enumerate(col_widths):
+            if col_idx < len(table.columns):
+                set_column_width(table.columns[col_idx], width_cm)
+    # =====================================================
+    return table
+
+def insert_table(doc, placeholder, df, config):
+    """Thay paragraph chứa placeholder bằng bảng Word dựng từ df."""
+    insert_tables(doc, placeholder, [(df, config)])
+
+def insert_tables(doc, placeholder, parts, note=None):
+    """
+    Thay paragraph chứa placeholder bằng 1 hoặc nhiều bảng (bảng rộng đã tách, xem table_budget.py).
+    note: dòng ghi chú in nghiêng ngay sau bảng (vd: số dòng bị bỏ do giới hạn kích thước).
+    """
+    # Tìm placeholder và chèn bảng
+    for p in doc.paragraphs:
+        if placeholder in p.text:
+            for i, (df, config) in enumerate(parts):
+                if i:
+                    # Đoạn trống giữa 2 bảng, không thì Word gộp thành 1 bảng
+                    p._element.addprevious(OxmlElement("w:p"))
+                p._element.addprevious(build_table(doc, df, config)._element)
+
+            if note:
+                p.text = note
+                for run in p.runs:
+                    run.italic = True
+            else:
+                p._element.getparent().remove(p._element)
+
+def insert_appendix(doc, block):
+    """Full text của các ô bị cắt: tại placeholder (nếu template có) hoặc cuối document."""
+    anchor = next((p for p in doc.paragraphs if block["placeholder"] in p.text), None)
+
+    def add(text, bold=False, size=None, font=None):
+        p = doc.add_paragraph()
+        run = p.add_run(text)
+        run.bold = bold
+        if size:
+            run.font.size = Pt(size)
+        if font:
+            run.font.name = font
+        if anchor is not None:
+            anchor._element.addprevious(p._element)
+
+    add(block["title"], bold=True, size=12)
+    if block.get("attachment"):
+        add(f"Full text của {len(block['entries'])} đoạn bị cắt: xem file đính kèm {block['attachment']}")
+    else:
+        for entry in block["entries"]:
+            add(appendix_heading(entry), bold=True, size=9)
+            add(entry["text"], size=8, font="Consolas")
+
+    if anchor is not None:
+        anchor._element.getparent().remove(anchor._element)
+
+# ==================== REPORT MODEL ====================
+# 1 lần đọc / chọn cột / vẽ chart -> model trung gian, rồi các writer (docx, xlsx, html, md) chỉ việc serialise.
+# model = {"source": ..., "collect_date": "MM.YYYY", "blocks": [block, ...]}
+# block = {"placeholder", "type": "table" | "chart" | "text" | "appendix", "title", "config",
+#          "data": DataFrame (table) | "image": PNG bytes (chart) | "text": str (text) | "entries": list (appendix)}
+# Bảng đã qua table_budget.apply_table_budget: có thể thêm "column_groups" (tách bảng rộng) và "note".
+
+def build_report_model(excel_file, mapping: dict, chart_mapping: dict = None, rules: list = None,
+                       timings: dict = None):
+    # excel_file: đường dẫn, hoặc object có .parse()/.sheet_names như pd.ExcelFile (vd: report_cache.CachedWorkbook)
+    with stage(timings, "workbook_open"):
+        xls = excel_file if hasattr(excel_file, "parse") else pd.ExcelFile(excel_file)
+
+    source = excel_file if isinstance(excel_file, str) else getattr(excel_file, "path", "")
+    model = {"source": source, "collect_date": datetime.now().strftime("%m.%Y"), "blocks": []}
 
-    # Xử lý các placeholder bảng
+    # Findings chỉ tính khi mapping có placeholder dùng tới ("findings": "table" / "summary")
+    findings = None
+    appendix = {}  # ref -> full text của các ô bị cắt (table_budget.py)
+    if any(config and config.get("findings") for config in mapping.values()):
+        with stage(timings, "rules_eval"):
+            findings = evaluate_rules(xls, rules)
+        print(f"🔎 Evaluated rules: {len(findings)} findings")
+
+    # Các placeholder bảng
     for placeholder, config in mapping.items():
         try:
             # Xử lý collect_date
             if placeholder == "<collect_date>":
-                current_date = datetime.now().strftime("%m.%Y")
-                replace_placeholder_text(doc, placeholder, current_date)
-                print(f"✅ Replaced {placeholder} with {current_date}")
+                model["blocks"].append({"placeholder": placeholder, "type": "text", "title": "Collect date",
+                                        "config": config, "text": model["collect_date"]})
                 continue
 
-            if not config:
+            if not config or config.get("appendix"):
                 continue
 
-            sheet_name = config["sheet"]
-            df = pd.read_excel(xls, sheet_name=sheet_name)
-            
-            # ==========LOGIC của phần TRANSPOSE==========
-            if config.get("transpose", False):
-                if "columns" in config and config["columns"]:
-                    col_indices = config["columns"]
-                    selected_cols = [df.columns[i] for i in col_indices if i < len(df.columns)]
-                    df = df[selected_cols]
-                
-                original_first_col = df.columns[0]
-                
-                # Transpose: cột thành hàng, hàng thành cột
-                df = df.T.reset_index()
-                
-                if len(df.columns) > 1:
-                    new_columns = [original_first_col] + [str(val) for val in df.iloc[0, 1:].tolist()]
-                    df.columns = new_columns
-                    df = df.iloc[1:].reset_index(drop=True)
-                
-                df = df.loc[:, ~df.columns.str.lower().str.contains('nan', na=False)]
-                df = df.loc[:, df.columns.str.strip() != '']
-            # ====================================
+            if config.get("findings"):
+                df = summarize_findings(findings) if config["findings"] == "summary" else findings
+                title = config.get("title", "Findings summary" if config["findings"] == "summary" else "Findings")
             else:
-                if "columns" in config and config["columns"]:
-                    col_indices = config["columns"]
-                    selected = [df.columns[i] for i in col_indices if i < len(df.columns)]
-                    df = df[selected]
-
-            max_rows = config.get("max_rows", None)
-            if max_rows and len(df) > max_rows:
-                df = df.head(max_rows)
-
-            # Tìm placeholder và chèn bảng
-            for p in doc.paragraphs:
-                if placeholder in p.text:
-                    table = doc.add_table(rows=1, cols=len(df.columns))
-                    table.autofit = True
-                    set_table_borders(table)
-                    
-                    hdr_cells = table.rows[0].cells
-                    header_height = config.get("header_height", 1.8)
-                    set_row_height(table.rows[0], header_height)
-                    
-                    # ========== TEXT DIRECTION CHO HEADER ==========
-                    use_vertical_header = config.get("vertical_header", False)
-                    for j, col in enumerate(df.columns):
-                        hdr_cells[j].text = str(col)
-                        set_cell_bg(hdr_cells[j], "0066CC")
-                        format_cell(hdr_cells[j], bold=True, font_color=RGBColor(255, 255, 255))
-                        if use_vertical_header:
-                            set_cell_text_direction(hdr_cells[j], "tbRl")
-                    # ==============================================
-
-                    # ========== TEXT DIRECTION CHO BODY CELLS ==========
-                    horizontal_columns = config.get("horizontal_columns", [])
-                    vertical_body = config.get("vertical_body", False)
-                    row_height = config.get("row_height", 1.8)
-                    
-                    for _, row in df.iterrows():
-                        new_row = table.add_row()
-                        row_cells = new_row.cells
-                        set_row_height(new_row, row_height)
-                        
-                        for j, val in enumerate(row):
-                            row_cells[j].text = str(val)
-                            format_cell(row_cells[j])
-                            
-                            if vertical_body:
-                                col_name = df.columns[j]
-                                if col_name not in horizontal_columns:
-                                    set_cell_text_direction(row_cells[j], "tbRl")
-                    # ==================================================
-
-                    p._element.getparent().replace(p._element, table._element)
-                    
-                    if "column_widths" in config:
-                        col_widths = config["column_widths"]
-                        for col_idx, width_cm in enumerate(col_widths):
-                            if col_idx < len(table.columns):
-                                set_column_width(table.columns[col_idx], width_cm)
-                    # =====================================================
-
-            print(f"✅ Replaced {placeholder} with sheet '{sheet_name}' (rows={len(df)})")
+                with stage(timings, "sheet_load"):
+                    df = xls.parse(config["sheet"])
+                title = config.get("title", config["sheet"])
 
+            with stage(timings, "table_select"):
+                df = select_table_data(df, config)
+            with stage(timings, "table_budget"):
+                df, extra = apply_table_budget(df, config, title, appendix)
+            model["blocks"].append({"placeholder": placeholder, "type": "table", "title": title,
+                                    "config": config, "data": df, **extra})
         except Exception as e:
             print(f"⚠️ Could not process {placeholder}: {e}")
 
-    # ========== chèn CHART PLACEHOLDERS ==========
-    if chart_mapping:
-        for placeholder, config in chart_mapping.items():
-            try:
-                sheet_name = config["sheet"]
-                chart_title = config.get("title", sheet_name)
-                df = pd.read_excel(xls, sheet_name=sheet_name)
-                
-                temp_image = f"temp_chart_{placeholder.strip('<>').replace('_', '')}.png"
-                temp_images.append(temp_image)
-                
-                label_col = config.get("label_col", 0)
-                value_col = config.get("value_col", 1)
-                top_n = config.get("top_n", 10)
-                
-                if create_pie_chart(df, chart_title, temp_image, label_col, value_col, top_n):
+    # Các placeholder chart: vẽ 1 lần ra PNG bytes, writer nào cũng dùng lại được
+    for placeholder, config in (chart_mapping or {}).items():
+        try:
+            sheet_name = config["sheet"]
+            chart_title = config.get("title", sheet_name)
+            with stage(timings, "sheet_load"):
+                df = xls.parse(sheet_name)
+
+            image = io.BytesIO()
+            with stage(timings, "chart_render"):
+                created = create_pie_chart(df, chart_title, image, config.get("label_col", 0),
+                                           config.get("value_col", 1), config.get("top_n", 10))
+            if created:
+                model["blocks"].append({"placeholder": placeholder, "type": "chart", "title": chart_title,
+                                        "config": config, "image": image.getvalue()})
+        except Exception as e:
+            print(f"⚠️ Could not create chart for {placeholder}: {e}")
+
+    # Appendix: "<appendix>": {"appendix": "inline" | "attachment"} trong mapping, mặc định inline cuối report
+    if appendix:
+        placeholder, config = next(((p, c) for p, c in mapping.items() if c and c.get("appendix")),
+                                   ("<appendix>", {"appendix": "inline"}))
+        model["blocks"].append({"placeholder": placeholder, "type": "appendix",
+                                "title": config.get("title", "Appendix - Full text"),
+                                "config": config, "entries": list(appendix.values())})
+
+    return model
+
+# ==================== DOCX WRITER ====================
+def write_docx(model, template_file, output_file, timings: dict = None):
+    """Điền model vào template Word (thay placeholder bằng bảng / chart / text)."""
+    with stage(timings, "template_load"):
+        doc = Document(template_file)
+
+    for block in model["blocks"]:
+        placeholder = block["placeholder"]
+        try:
+            if block["type"] == "text":
+                replace_placeholder_text(doc, placeholder, block["text"])
+                print(f"✅ Replaced {placeholder} with {block['text']}")
+            elif block["type"] == "table":
+                with stage(timings, "table_build"):
+                    insert_tables(doc, placeholder, table_parts(block), block.get("note"))
+                print(f"✅ Replaced {placeholder} with '{block['title']}' (rows={len(block['data'])})")
+            elif block["type"] == "appendix":
+                with stage(timings, "table_build"):
+                    insert_appendix(doc, block)
+                print(f"✅ Added {block['title']} ({len(block['entries'])} entries)")
+            elif block["type"] == "chart":
+                with stage(timings, "chart_insert"):
                     for p in doc.paragraphs:
                         if placeholder in p.text:
                             p.text = p.text.replace(placeholder, "")
                             run = p.add_run()
-                            run.add_picture(temp_image, width=Inches(5.5))
+                            run.add_picture(io.BytesIO(block["image"]), width=Inches(5.5))
                             print(f"✅ Inserted chart for {placeholder}")
                             break
-            except Exception as e:
-                print(f"⚠️ Could not create chart for {placeholder}: {e}")
-    # =============================================
+        except Exception as e:
+            print(f"⚠️ Could not process {placeholder}: {e}")
 
     # Lưu file
-    try:
-        doc.save(output_file)
-        print(f"\n✅ Report generated: {output_file}")
-    except PermissionError:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(output_file)[0]
-        new_output = f"{base_name}_{timestamp}.docx"
-        doc.save(new_output)
-        print(f"\n⚠️ File đang mở. Đã lưu thành: {new_output}")
-    
-    for temp_img in temp_images:
+    with stage(timings, "doc_save"):
         try:
-            if os.path.exists(temp_img):
-                os.remove(temp_img)
-        except:
-            pass
+            doc.save(output_file)
+            print(f"\n✅ Report generated: {output_file}")
+        except PermissionError:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            base_name = os.path.splitext(output_file)[0]
+            new_output = f"{base_name}_{timestamp}.docx"
+            doc.save(new_output)
+            print(f"\n⚠️ File đang mở. Đã lưu thành: {new_output}")
+
+# ==================== MAIN REPORT GENERATOR ====================
+def template_placeholders(template_file, candidates):
+    """Các placeholder trong candidates có xuất hiện trong template (cùng cách dò như insert_table)."""
+    doc = Document(template_file)
+    if hasattr(template_file, "seek"):
+        template_file.seek(0)
+    text = "\n".join(p.text for p in doc.paragraphs)
+    return {placeholder for placeholder in candidates if placeholder in text}
+
+def normalize_formats(formats):
+    """"docx" / "docx,html" / ("docx", "xlsx") -> tuple; ValueError nếu có format không hỗ trợ."""
+    if isinstance(formats, str):
+        formats = formats.split(",")
+    formats = tuple(fmt.strip().lower() for fmt in formats if fmt.strip())
+    supported = {"docx"} | set(WRITERS)
+    unknown = [fmt for fmt in formats if fmt not in supported]
+    if unknown or not formats:
+        raise ValueError(f"Format không hỗ trợ: {unknown or formats} (hỗ trợ: {', '.join(sorted(supported))})")
+    return formats
+
+def generate_report(excel_file: str, template_file: str, output_file: str, mapping: dict, chart_mapping: dict = None,
+                    rules: list = None, timings: dict = None, formats=("docx",)):
+    """
+    Build model 1 lần rồi ghi ra các format trong formats ("docx", "xlsx", "html", "md").
+    Format khác docx được ghi cạnh output_file, cùng tên, khác đuôi.
+    timings: dict tuỳ chọn, được cộng dồn số giây theo từng stage (dùng cho benchmark.py / report_service.py)
+    """
+    formats = normalize_formats(formats)
+
+    # Chỉ xuất docx mà template không có <findings>/<findings_summary> -> bỏ placeholder findings để khỏi chạy rules
+    findings_placeholders = [p for p, config in mapping.items() if config and config.get("findings")]
+    if formats == ("docx",) and findings_placeholders:
+        present = template_placeholders(template_file, findings_placeholders)
+        mapping = {p: config for p, config in mapping.items()
+                   if p not in findings_placeholders or p in present}
+
+    model = build_report_model(excel_file, mapping, chart_mapping, rules, timings)
+    base_name = os.path.splitext(output_file)[0] if isinstance(output_file, str) else None
+
+    # Appendix dạng file đính kèm: ghi 1 lần, các format chỉ nhắc tên file (output không phải path -> để inline)
+    for block in model["blocks"]:
+        if block["type"] == "appendix" and block["config"].get("appendix") == "attachment" and base_name:
+            with stage(timings, "write_appendix"):
+                path = f"{base_name}_appendix.txt"
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(appendix_text(block))
+            block["attachment"] = os.path.basename(path)
+            print(f"✅ Appendix written: {path}")
+
+    if "docx" in formats:
+        write_docx(model, template_file, output_file, timings)
+
+    for fmt in formats:
+        if fmt == "docx":
+            continue
+        if base_name is None:
+            print(f"⚠️ Bỏ qua format {fmt}: output_file không phải đường dẫn")
+            continue
+        with stage(timings, f"write_{fmt}"):
+            path = f"{base_name}.{fmt}"
+            WRITERS[fmt](model, path)
+            print(f"✅ Report generated: {path}")
+    return model
+
+def template_keyword(template_file):
+    """Lấy phần 'INS...' trong tên template (vd: SGC_SQL_HEALTHCHECK_INS105DCDBCF.docx -> INS105DCDBCF)."""
+    base_name = os.path.splitext(os.path.basename(template_file))[0]
+    for part in base_name.split("_"):
+        if part.startswith("INS"):
+            return part
+    return None
+
+def find_templates(template_folder, excel_name):
+    """Các template (tên file) có keyword 'INS...' nằm trong tên file Excel."""
+    matches = []
+    for template_file in sorted(os.listdir(template_folder)):
+        if not template_file.lower().endswith(".docx") or template_file.startswith("~$"):
+            continue
+        keyword = template_keyword(template_file)
+        if keyword and keyword in excel_name:
+            matches.append(template_file)
+    return matches
+
+# ========== MAPPING CỦA CÁC BẢNG ==========
+DEFAULT_MAPPING = {
+    # TRANSPOSE: Chuyển cột thành hàng
+    "<volume_info>": {
+        "sheet": "Volume Info",
+        "columns": [0, 1, 2, 3, 4, 5],
+        "transpose": True
+    },
+
+    "<file_size>": {
+        "sheet": "File Sizes and Space",
+        "columns": [0, 1, 2, 3, 4, 5, 7],
+        "max_rows": 50
+    },
+
+    # TEXT DIRECTION: cho cái sheet fileio
+    "<fileio>": {
+        "sheet": "IO Stats By File",
+        "max_rows": 50,
+        "vertical_header": True,
+        "vertical_body": True,
+        "horizontal_columns": ["Database Name", "Logical Name", "type_desc", "Physical Name", "file_id"],
+        "header_height": 2.0,
+        "row_height": 1.8,
+        "column_widths": [2.5, 2.5, 1.2, 2.0, 10.0, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5],
+        # Bảng ~20 cột: tách thành nhiều bảng, mỗi bảng lặp lại Database Name + Logical Name
+        "max_columns": 10,
+        "key_columns": 2
+    },
+
+    "<conn_count>": {
+        "sheet": "Connection Counts by IP Address",
+        "max_rows": 50
+    },
+    "<cpu_usage>": {
+        "sheet": "CPU Usage by Database",
+        "columns": [0, 1, 3],
+        "max_rows": 50
+    },
+    "<io_usage>": {
+        "sheet": "IO Usage By Database",
+        "columns": [0, 1, 3],
+        "max_rows": 50
+    },
+    "<buffer_usage>": {
+        "sheet": "Total Buffer Usage by Database",
+        "columns": [0, 1, 3],
+        "max_rows": 50
+    },
+    "<top_worker>": {
+        "sheet": "Top Worker Time Queries",
+        "columns": [0, 1, 2, 4],
+        "max_rows": 50,
+        # Query text dài: giữ snippet trong bảng, full text ở appendix
+        "max_text_len": 120
+    },
+    "<missing_index>": {
+        "sheet": "Missing Indexes",
+        "columns": [2, 5, 6, 7, 9],
+        "max_rows": 50
+    },
+    "<agent_job>": {
+        "sheet": "SQL Server Agent Jobs",
+        "columns": [0, 1, 2, 3, 4, 8, 9],
+        "max_rows": 50
+    },
+    "<recent_bk>": {
+        "sheet": "Recent Full Backups",
+        "columns": [2, 3, 4, 5, 11],
+        "max_rows": 50
+    },
+    "<findings>": {
+        "findings": "table",
+        "max_rows": 100
+    },
+    "<findings_summary>": {
+        "findings": "summary"
+    },
+    "<appendix>": {
+        "appendix": "inline"  # "attachment": ghi ra <report>_appendix.txt thay vì chèn vào report
+    },
+    "<collect_date>": {}
+}
+
+# ========== CHART MAPPING ==========
+DEFAULT_CHART_MAPPING = {
+    "<cpu_usage_chart>": {
+        "sheet": "CPU Usage by Database",
+        "title": "Chart 1. CPU Usage by Database",
+        "label_col": 1,
+        "value_col": 3,
+        "top_n": 10
+    },
+    "<io_usage_chart>": {
+        "sheet": "IO Usage By Database",
+        "title": "Chart 2. IO Usage By Database",
+        "label_col": 1,
+        "value_col": 3,
+        "top_n": 10
+    },
+    "<buffer_usage_chart>": {
+        "sheet": "Total Buffer Usage by Database",
+        "title": "Chart 3. Total Buffer Usage by Database",
+        "label_col": 1,
+        "value_col": 3,
+        "top_n": 10
+    }
+}
 
 # ==================== MAIN EXECUTION ====================
 if __name__ == "__main__":
@@ -290,112 +594,17 @@ if __name__ == "__main__":
     output_folder = r"D:\INTERNSHIP\SQL_merge_260112\SQL_merge\SQL_merge\reports"
     os.makedirs(output_folder, exist_ok=True)
 
-    # ========== MAPPING CỦA CÁC BẢNG ==========
-    mapping = {
-        # TRANSPOSE: Chuyển cột thành hàng
-        "<volume_info>": {
-            "sheet": "Volume Info",
-            "columns": [0, 1, 2, 3, 4, 5],
-            "transpose": True
-        },
-        
-        "<file_size>": {
-            "sheet": "File Sizes and Space",
-            "columns": [0, 1, 2, 3, 4, 5, 7],
-            "max_rows": 50
-        },
-        
-        # TEXT DIRECTION: cho cái sheet fileio
-        "<fileio>": {
-            "sheet": "IO Stats By File",
-            "max_rows": 50,
-            "vertical_header": True,
-            "vertical_body": True,
-            "horizontal_columns": ["Database Name", "Logical Name", "type_desc", "Physical Name", "file_id"],
-            "header_height": 2.0,
-            "row_height": 1.8,
-            "column_widths": [2.5, 2.5, 1.2, 2.0, 10.0, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5]  
-        },
-        
-        "<conn_count>": {
-            "sheet": "Connection Counts by IP Address",
-            "max_rows": 50
-        },
-        "<cpu_usage>": {
-            "sheet": "CPU Usage by Database",
-            "columns": [0, 1, 3],
-            "max_rows": 50
-        },
-        "<io_usage>": {
-            "sheet": "IO Usage By Database",
-            "columns": [0, 1, 3],
-            "max_rows": 50
-        },
-        "<buffer_usage>": {
-            "sheet": "Total Buffer Usage by Database",
-            "columns": [0, 1, 3],
-            "max_rows": 50
-        },
-        "<top_worker>": {
-            "sheet": "Top Worker Time Queries",
-            "columns": [0, 1, 2, 4],
-            "max_rows": 50
-        },
-        "<missing_index>": {
-            "sheet": "Missing Indexes",
-            "columns": [2, 5, 6, 7, 9],
-            "max_rows": 50
-        },
-        "<agent_job>": {
-            "sheet": "SQL Server Agent Jobs",
-            "columns": [0, 1, 2, 3, 4, 8, 9],
-            "max_rows": 50
-        },
-        "<recent_bk>": {
-            "sheet": "Recent Full Backups",
-            "columns": [2, 3, 4, 5, 11],
-            "max_rows": 50
-        },
-        "<collect_date>": {}
-    }
-
-    # ========== CHART MAPPING ==========
-    chart_mapping = {
-        "<cpu_usage_chart>": {
-            "sheet": "CPU Usage by Database",
-            "title": "Chart 1. CPU Usage by Database",
-            "label_col": 1,
-            "value_col": 3,
-            "top_n": 10
-        },
-        "<io_usage_chart>": {
-            "sheet": "IO Usage By Database",
-            "title": "Chart 2. IO Usage By Database",
-            "label_col": 1,
-            "value_col": 3,
-            "top_n": 10
-        },
-        "<buffer_usage_chart>": {
-            "sheet": "Total Buffer Usage by Database",
-            "title": "Chart 3. Total Buffer Usage by Database",
-            "label_col": 1,
-            "value_col": 3,
-            "top_n": 10
-        }
-    }
+    mapping = DEFAULT_MAPPING
+    chart_mapping = DEFAULT_CHART_MAPPING
+    rules = DEFAULT_RULES  # xem rules_engine.py
+    formats = ("docx",)  # thêm "xlsx", "html", "md" để xuất cùng lúc (xem report_writers.py)
 
     # ========== XỬ LÝ TẤT CẢ TEMPLATE ==========
     for template_file in os.listdir(template_folder):
         if not template_file.lower().endswith(".docx") or template_file.startswith("~$"):
             continue
 
-        base_name = os.path.splitext(template_file)[0]
-        keyword = None
-        for part in base_name.split("_"):
-            if part.startswith("INS"):
-                keyword = part
-                break
-
+        keyword = template_keyword(template_file)
         if not keyword:
             print(f"⚠️ Không tìm thấy keyword 'INS...' trong {template_file}")
             continue
@@ -422,5 +631,7 @@ if __name__ == "__main__":
             template_file=os.path.join(template_folder, template_file),
             output_file=output_file,
             mapping=mapping,
-            chart_mapping=chart_mapping
+            chart_mapping=chart_mapping,
+            rules=rules,
+            formats=formats
         )
\ No newline at end of file
@@ -0,0 +1,236 @@
+import os
+import glob
+import operator
+import pandas as pd
+from datetime import datetime
+
+# ==================== RULE DEFINITIONS ====================
+# Mỗi rule là một dict giống style của mapping trong rpwithchart.py:
+# - "threshold": so sánh 1 cột với 1 giá trị   (column, op, value)
+# - "expression": biểu thức pandas.eval trên cả sheet (expr, value_expr tuỳ chọn)
+# - "age": số ngày từ 1 cột ngày tới thời điểm chạy   (column, days, group_by tuỳ chọn)
+# Tất cả đều được tính bằng phép toán trên cả cột (vectorised), không lặp từng dòng.
+
+SEVERITY_ORDER = ["Critical", "Warning", "Info"]
+
+DATE_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+
+FINDING_COLUMNS = ["Severity", "Rule", "Sheet", "Object", "Value", "Message"]
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+DEFAULT_RULES = [
+    {
+        "id": "FILE_FREE_SPACE_LOW",
+        "sheet": "File Sizes and Space",
+        "type": "expression",
+        "expr": "`Available Space In MB` / `Total Size in MB` * 100 < 10",
+        "value_expr": "`Available Space In MB` / `Total Size in MB` * 100",
+        "object_col": "Physical Name",
+        "severity": "Warning",
+        "message": "Data/log file has less than 10% free space"
+    },
+    {
+        "id": "VOLUME_FREE_SPACE_LOW",
+        "sheet": "Volume Info",
+        "type": "threshold",
+        "column": "Space Free %",
+        "op": "<",
+        "value": 15,
+        "object_col": "volume_mount_point",
+        "severity": "Critical",
+        "message": "Volume has less than 15% free space"
+    },
+    {
+        "id": "FULL_BACKUP_STALE",
+        "sheet": "Recent Full Backups",
+        "type": "age",
+        "column": "Backup Finish Date",
+        "days": 7,
+        "group_by": "Database Name",
+        "object_col": "Database Name",
+        "severity": "Critical",
+        "message": "Last full backup is older than 7 days"
+    },
+    {
+        "id": "AGENT_JOB_NO_NOTIFY",
+        "sheet": "SQL Server Agent Jobs",
+        "type": "expression",
+        "expr": "`Job Enabled` == 1 and notify_email_operator_id == 0",
+        "object_col": "Job Name",
+        "severity": "Info",
+        "message": "Enabled job has no e-mail operator on failure",
+        "dedupe": True
+    },
+    {
+        "id": "MISSING_INDEX_HIGH_IMPACT",
+        "sheet": "Missing Indexes",
+        "type": "threshold",
+        "column": "avg_user_impact",
+        "op": ">=",
+        "value": 90,
+        "object_col": "Database.Schema.Table",
+        "severity": "Warning",
+        "message": "Missing index with estimated impact >= 90%"
+    },
+]
+
+# ==================== EVALUATION ====================
+def _parse_dates(series, date_format=DATE_FORMAT):
+    parsed = pd.to_datetime(series, format=date_format, errors="coerce")
+    # Nếu format không khớp thì để pandas tự đoán
+    if parsed.isna().all() and series.notna().any():
+        parsed = pd.to_datetime(series, errors="coerce")
+    return parsed
+
+def _rule_mask(df, rule, now):
+    """Trả về (mask, value) cho một rule, cả hai đều là Series cùng index với df."""
+    rule_type = rule.get("type", "threshold")
+
+    if rule_type == "threshold":
+        values = pd.to_numeric(df[rule["column"]], errors="coerce")
+        mask = OPERATORS[rule.get("op", ">")](values, rule["value"])
+        return mask.fillna(False), values
+
+    if rule_type == "expression":
+        mask = df.eval(rule["expr"])
+        values = df.eval(rule["value_expr"]) if rule.get("value_expr") else pd.Series(pd.NA, index=df.index)
+        return pd.Series(mask, index=df.index).fillna(False).astype(bool), values
+
+    if rule_type == "age":
+        dates = _parse_dates(df[rule["column"]], rule.get("date_format", DATE_FORMAT))
+        group_by = rule.get("group_by")
+        if group_by:
+            # Chỉ xét bản ghi mới nhất của mỗi nhóm (vd: backup gần nhất của mỗi DB)
+            latest = dates.groupby(df[group_by]).transform("max")
+            is_latest = dates.eq(latest) & ~pd.DataFrame({"key": df[group_by], "date": dates}).duplicated()
+        else:
+            is_latest = pd.Series(True, index=df.index)
+        age_days = (now - dates).dt.days
+        mask = is_latest & (age_days > rule["days"])
+        return mask.fillna(False), age_days
+
+    raise ValueError(f"Unknown rule type: {rule_type}")
+
+def evaluate_sheet(df, rules, now=None):
+    """Chạy tất cả rule của 1 sheet, trả về DataFrame findings."""
+    now = now or datetime.now()
+    frames = []
+    for rule in rules:
+        # Lỗi ở 1 rule (vd: gõ sai tên cột) không làm mất findings của các rule khác cùng sheet
+        try:
+            mask, values = _rule_mask(df, rule, now)
+        except Exception as e:
+            print(f"   ❌ Lỗi rule '{rule.get('id')}' trên sheet '{rule.get('sheet')}': {e}")
+            continue
+        if not mask.any():
+            continue
+
+        object_col = rule.get("object_col")
+        objects = df.loc[mask, object_col].astype(str) if object_col in df.columns else df.index[mask].astype(str)
+        found = pd.DataFrame({
+            "Severity": rule.get("severity", "Warning"),
+            "Rule": rule["id"],
+            "Sheet": rule["sheet"],
+            "Object": objects.values,
+            "Value": pd.to_numeric(values[mask], errors="coerce").round(2).values,
+            "Message": rule.get("message", ""),
+        })
+        if rule.get("dedupe"):
+            found = found.drop_duplicates(["Rule", "Object"])
+        frames.append(found)
+
+    if not frames:
+        return pd.DataFrame(columns=FINDING_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def evaluate_rules(xls, rules=None, now=None):
+    """
+    Evaluate rules on a merged healthcheck workbook.
+    - xls: đường dẫn file Excel, pd.ExcelFile đã mở, hoặc object tương tự (.parse / .sheet_names).
+    - Mỗi sheet chỉ được đọc 1 lần dù có nhiều rule dùng chung.
+    """
+    rules = DEFAULT_RULES if rules is None else rules
+    if not hasattr(xls, "parse"):
+        xls = pd.ExcelFile(xls)
+
+    rules_by_sheet = {}
+    for rule in rules:
+        rules_by_sheet.setdefault(rule["sheet"], []).append(rule)
+
+    sheets = [s for s in rules_by_sheet if s in xls.sheet_names]
+    for missing in set(rules_by_sheet) - set(sheets):
+        print(f"   ⚠️ Sheet '{missing}' không có trong workbook, bỏ qua rule")
+
+    frames = []
+    for sheet_name in sheets:
+        try:
+            df = xls.parse(sheet_name)
+            frames.append(evaluate_sheet(df, rules_by_sheet[sheet_name], now))
+        except Exception as e:
+            print(f"   ❌ Lỗi rule trên sheet '{sheet_name}': {e}")
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=FINDING_COLUMNS)
+    findings = pd.concat(frames, ignore_index=True)
+    return sort_findings(findings)
+
+def sort_findings(findings):
+    severity = pd.Categorical(findings["Severity"], categories=SEVERITY_ORDER, ordered=True)
+    return (findings.assign(_sev=severity)
+                    .sort_values(["_sev", "Rule", "Object"], kind="stable")
+                    .drop(columns="_sev")
+                    .reset_index(drop=True))
+
+def summarize_findings(findings):
+    """Bảng tổng hợp số finding theo severity (dùng cho placeholder <findings_summary>)."""
+    group_cols = ["Instance"] if "Instance" in findings.columns else []
+    counts = findings.groupby(group_cols + ["Severity"]).size()
+    if group_cols:
+        summary = counts.unstack("Severity", fill_value=0)
+    else:
+        summary = counts.to_frame().T
+    summary = summary.reindex(columns=SEVERITY_ORDER, fill_value=0)
+    summary["Total"] = summary.sum(axis=1)
+    summary = summary.reset_index(drop=not group_cols)
+    summary.columns.name = None
+    return summary
+
+# ==================== FLEET ====================
+def evaluate_fleet(excel_folder, rules=None, now=None):
+    """Chạy rule trên tất cả workbook *_healthcheck_info.xlsx trong excel_folder."""
+    now = now or datetime.now()
+    frames = []
+    for excel_file in sorted(glob.glob(os.path.join(excel_folder, "*_healthcheck_info.xlsx"))):
+        filename = os.path.basename(excel_file)
+        if filename.startswith("~$"):
+            continue
+        instance = filename.split("_")[0]
+        findings = evaluate_rules(excel_file, rules, now)
+        print(f"   🔎 {instance}: {len(findings)} findings")
+        if not findings.empty:
+            frames.append(findings.assign(Instance=instance))
+
+    if not frames:
+        return pd.DataFrame(columns=["Instance"] + FINDING_COLUMNS)
+    findings = pd.concat(frames, ignore_index=True)
+    return sort_findings(findings)[["Instance"] + FINDING_COLUMNS]
+
+
+if __name__ == "__main__":
+    excel_folder = r"D:\SQL_merge\SQL_merge\output"
+    output_file = os.path.join(excel_folder, "fleet_findings.xlsx")
+
+    findings = evaluate_fleet(excel_folder)
+    with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+        summarize_findings(findings).to_excel(writer, sheet_name="Summary", index=False)
+        findings.to_excel(writer, sheet_name="Findings", index=False)
+    print(f"✅ Done! File findings: {output_file}")
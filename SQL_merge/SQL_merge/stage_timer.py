@@ -0,0 +1,17 @@
+import time
+from contextlib import contextmanager
+
+@contextmanager
+def stage(timings, name):
+    """
+    Cộng dồn thời gian (giây) của một stage vào dict timings[name].
+    timings=None -> không đo gì, để code gọi không cần if/else.
+    """
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
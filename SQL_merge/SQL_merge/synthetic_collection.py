@@ -0,0 +1,206 @@
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from docx import Document
+
+# ==================== SYNTHETIC COLLECTION GENERATOR ====================
+# Sinh folder input giả lập giống input/INS105DCDBCF (CSV + .sql + .sqlplan)
+# để benchmark merge_sql_csv / generate_report với kích thước tuỳ chỉnh.
+# Cùng seed -> cùng dữ liệu, để kết quả benchmark so sánh được giữa các lần chạy.
+
+TIMESTAMP = "202512111511291129"
+
+# sheet -> (số DQ, level, [(tên cột, kiểu dữ liệu)])
+# level "instance": 1 file CSV cho cả instance, "database": 1 file CSV mỗi database
+SHEET_SCHEMAS = {
+    "Volume Info": (27, "instance", [
+        ("volume_mount_point", "volume"), ("file_system_type", "fs"), ("logical_volume_name", "name"),
+        ("Total Size (GB)", "float"), ("Available Size (GB)", "float"), ("Space Free %", "pct"),
+        ("supports_compression", "flag"), ("is_compressed", "flag"),
+        ("supports_sparse_files", "flag"), ("supports_alternate_streams", "flag"),
+    ]),
+    "File Sizes and Space": (50, "database", [
+        ("File Name", "db"), ("Physical Name", "path"), ("Total Size in MB", "float"),
+        ("Available Space In MB", "float"), ("file_id", "rank"), ("Filegroup Name", "filegroup"),
+        ("is_percent_growth", "flag"), ("growth", "int"), ("is_default", "flag"), ("is_read_only", "flag"),
+    ]),
+    "IO Stats By File": (52, "database", [
+        ("Database Name", "db"), ("Logical Name", "name"), ("file_id", "rank"), ("type_desc", "filetype"),
+        ("Physical Name", "path"), ("Size on Disk (MB)", "float"), ("num_of_reads", "int"),
+        ("num_of_writes", "int"), ("io_stall_read_ms", "int"), ("io_stall_write_ms", "int"),
+        ("IO Stall Reads Pct", "pct"), ("IO Stall Writes Pct", "pct"), ("Writes + Reads", "int"),
+        ("MB Read", "float"), ("MB Written", "float"), ("# Reads Pct", "pct"), ("# Write Pct", "pct"),
+        ("Read Bytes Pct", "pct"), ("Written Bytes Pct", "pct"),
+    ]),
+    "Connection Counts by IP Address": (39, "instance", [
+        ("client_net_address", "ip"), ("program_name", "name"), ("host_name", "name"),
+        ("login_name", "name"), ("connection count", "int"),
+    ]),
+    "CPU Usage by Database": (35, "instance", [
+        ("CPU Rank", "rank"), ("Database Name", "db"), ("CPU Time (ms)", "int"), ("CPU Percent", "pct"),
+    ]),
+    "IO Usage By Database": (36, "instance", [
+        ("I/O Rank", "rank"), ("Database Name", "db"), ("Total I/O (MB)", "int"), ("Total I/O %", "pct"),
+        ("Read I/O (MB)", "int"), ("Read I/O %", "pct"), ("Write I/O (MB)", "int"), ("Write I/O %", "pct"),
+    ]),
+    "Total Buffer Usage by Database": (37, "instance", [
+        ("Buffer Pool Rank", "rank"), ("Database Name", "db"), ("Cached Size (MB)", "float"),
+        ("Buffer Pool Percent", "pct"),
+    ]),
+    "Top Worker Time Queries": (43, "instance", [
+        ("Database Name", "db"), ("Short Query Text", "query"), ("Total Worker Time", "int"),
+        ("Min Worker Time", "int"), ("Avg Worker Time", "int"), ("Max Worker Time", "int"),
+        ("Min Elapsed Time", "int"), ("Avg Elapsed Time", "int"), ("Max Elapsed Time", "int"),
+        ("Min Logical Reads", "int"), ("Avg Logical Reads", "int"), ("Max Logical Reads", "int"),
+        ("Execution Count", "int"), ("Has Missing Index", "flag"), ("Creation Time", "date"),
+    ]),
+    "SQL Server Agent Jobs": (10, "instance", [
+        ("Job Name", "name"), ("Job Description", "name"), ("Job Owner", "name"), ("Date Created", "date"),
+        ("Job Enabled", "flag"), ("notify_email_operator_id", "flag"), ("notify_level_email", "flag"),
+        ("CategoryName", "name"), ("Sched Enabled", "flag"), ("next_run_date", "int"), ("next_run_time", "int"),
+    ]),
+    "Top Avg Elapsed Time Queries": (49, "database", [
+        ("Short Query Text", "query"), ("Execution Count", "int"), ("Avg Elapsed Time", "int"),
+        ("Min Elapsed Time", "int"), ("Max Elapsed Time", "int"), ("Avg Worker Time", "int"),
+        ("Avg Logical Reads", "int"), ("Has Missing Index", "flag"), ("Creation Time", "date"),
+    ]),
+    "Missing Indexes": (63, "database", [
+        ("index_advantage", "float"), ("last_user_seek", "date"), ("Database.Schema.Table", "table"),
+        ("missing_indexes_for_table", "int"), ("similar_missing_indexes_for_table", "int"),
+        ("equality_columns", "columns"), ("inequality_columns", "columns"), ("included_columns", "columns"),
+        ("unique_compiles", "int"), ("user_seeks", "int"), ("avg_total_user_cost", "float"),
+        ("avg_user_impact", "pct"), ("Table Name", "name"), ("Table Rows", "int"),
+    ]),
+    "Recent Full Backups": (75, "database", [
+        ("machine_name", "name"), ("server_name", "name"), ("Database Name", "db"), ("recovery_model", "recovery"),
+        ("Uncompressed Backup Size (MB)", "int"), ("Compressed Backup Size (MB)", "int"),
+        ("Compression Ratio", "float"), ("has_backup_checksums", "flag"), ("is_copy_only", "flag"),
+        ("encryptor_type", "empty"), ("Backup Elapsed Time (sec)", "int"), ("Backup Finish Date", "date"),
+        ("Backup Location", "path"), ("physical_block_size", "int"),
+    ]),
+}
+
+# Các sheet có file .sql / .sqlplan đi kèm (giống collector thật)
+QUERY_SHEETS = ["Top Worker Time Queries", "Top Avg Elapsed Time Queries"]
+
+WORDS = ["SELECT", "FROM", "WHERE", "JOIN", "INSERT", "INTO", "UPDATE", "SET", "GROUP", "BY",
+         "ORDER", "[dbo].[CTPhatSinh]", "[MaThe13]", "@Mathe", "varchar(50)", "AND", "OR", "EXEC"]
+
+def _column(kind, rng, n, ctx):
+    """Sinh 1 cột n giá trị theo kiểu dữ liệu."""
+    idx = np.arange(n)
+    if kind == "db":
+        if ctx["db"] is not None:
+            return np.repeat(ctx["db"], n)
+        return np.array(ctx["databases"])[rng.integers(0, len(ctx["databases"]), n)]
+    if kind == "rank":
+        return idx + 1
+    if kind == "int":
+        return rng.integers(0, 10_000_000, n)
+    if kind == "float":
+        return np.round(rng.random(n) * 10_000, 2)
+    if kind == "pct":
+        return np.round(rng.random(n) * 100, 2)
+    if kind == "flag":
+        return rng.integers(0, 2, n)
+    if kind == "date":
+        offsets = rng.integers(0, 60 * 24 * 3600, n)
+        return [(ctx["now"] - timedelta(seconds=int(s))).strftime("%m/%d/%Y %I:%M:%S %p")
+                for s in offsets]
+    if kind == "query":
+        lengths = rng.integers(min(20, ctx["query_words"]), ctx["query_words"] + 1, n)
+        return [" ".join(np.array(WORDS)[rng.integers(0, len(WORDS), k)]) for k in lengths]
+    if kind == "path":
+        return [f"E:\\DATA\\{ctx['db'] or 'master'}_{i}.mdf" for i in idx]
+    if kind == "table":
+        return [f"[{ctx['db'] or 'master'}].[dbo].[T{i}]" for i in idx]
+    if kind == "columns":
+        return [f"[C{i % 7}], [C{(i + 3) % 11}]" for i in idx]
+    if kind == "ip":
+        return [f"10.10.{i // 250 % 250}.{i % 250 + 1}" for i in idx]
+    if kind == "volume":
+        return [f"{chr(ord('D') + i % 20)}:\\" for i in idx]
+    if kind == "fs":
+        return np.repeat("NTFS", n)
+    if kind == "filegroup":
+        return np.repeat("PRIMARY", n)
+    if kind == "filetype":
+        return np.where(idx % 2 == 0, "ROWS", "LOG")
+    if kind == "recovery":
+        return np.where(idx % 3 == 0, "SIMPLE", "FULL")
+    if kind == "empty":
+        return np.repeat(np.nan, n)
+    return [f"obj_{i}" for i in idx]
+
+def make_sheet(sheet_name, rows, rng, ctx):
+    _, _, schema = SHEET_SCHEMAS[sheet_name]
+    return pd.DataFrame({col: _column(kind, rng, rows, ctx) for col, kind in schema})
+
+def _write_query_files(prefix, sheet_name, count, rng, ctx):
+    # Collector thật ghi .sql/.sqlplan dạng UTF-16
+    for k in range(1, count + 1):
+        text = " ".join(np.array(WORDS)[rng.integers(0, len(WORDS), ctx["query_words"] * 4)])
+        with open(f"{prefix}-{sheet_name}-{k}-{TIMESTAMP}.sql", "w", encoding="utf-16") as f:
+            f.write(text)
+        with open(f"{prefix}-{sheet_name}-{k}-{TIMESTAMP}.sqlplan", "w", encoding="utf-16") as f:
+            f.write('<ShowPlanXML xmlns="http://schemas.microsoft.com/sqlserver/2004/07/showplan" Version="1.3.1">'
+                    f'<BatchSequence><Batch><Statements><StmtSimple StatementText="{text}"/>'
+                    '</Statements></Batch></BatchSequence></ShowPlanXML>')
+
+def write_synthetic_template(template_file, placeholders):
+    """Template Word tối giản: mỗi placeholder 1 paragraph."""
+    doc = Document()
+    doc.add_heading("SQL Server Health Check (synthetic)", level=1)
+    for placeholder in placeholders:
+        doc.add_paragraph(placeholder)
+    doc.save(template_file)
+
+def generate_collection(output_root, instances=1, databases=10, rows_per_sheet=50, sql_files=10,
+                        query_words=60, seed=0, placeholders=None):
+    """
+    Sinh output_root/input/<INS...>/ và output_root/rptemplate/ cho benchmark.
+    Trả về list tên instance đã sinh.
+    """
+    rng = np.random.default_rng(seed)
+    input_root = os.path.join(output_root, "input")
+    template_root = os.path.join(output_root, "rptemplate")
+    os.makedirs(template_root, exist_ok=True)
+
+    instance_names = []
+    for i in range(instances):
+        instance = f"INS{900 + i}SYN"
+        instance_names.append(instance)
+        folder = os.path.join(input_root, instance)
+        os.makedirs(folder, exist_ok=True)
+
+        db_names = [f"DB{j:03d}" for j in range(databases)]
+        ctx = {"databases": db_names, "db": None, "now": datetime(2025, 12, 11, 15, 11, 29),
+               "query_words": query_words}
+        server_prefix = os.path.join(folder, f"SYN-SQL{i:02d}$INST")
+
+        for sheet_name, (dq, level, _) in SHEET_SCHEMAS.items():
+            if level == "instance":
+                ctx["db"] = None
+                prefixes = [f"{server_prefix}-DQ-{dq}"]
+            else:
+                prefixes = [f"{server_prefix}-{db}-DQ-{dq}" for db in db_names]
+
+            for prefix, db in zip(prefixes, db_names if level == "database" else [None]):
+                ctx["db"] = db
+                make_sheet(sheet_name, rows_per_sheet, rng, ctx).to_csv(
+                    f"{prefix}-{sheet_name}-{TIMESTAMP}.csv", index=False)
+                if sheet_name in QUERY_SHEETS and sql_files:
+                    _write_query_files(prefix, sheet_name, sql_files, rng, ctx)
+
+        if placeholders:
+            write_synthetic_template(
+                os.path.join(template_root, f"SGC_SQL_HEALTHCHECK_{instance}.docx"), placeholders)
+
+    return instance_names
+
+
+if __name__ == "__main__":
+    output_root = r"D:\SQL_merge\SQL_merge\synthetic"
+    names = generate_collection(output_root, instances=3, databases=10, rows_per_sheet=50, sql_files=10)
+    print(f"✅ Done! Sinh {len(names)} instance tại: {output_root}")
@@ -0,0 +1,158 @@
+import re
+import math
+import hashlib
+import pandas as pd
+
+# ==================== TABLE BUDGET ====================
+# Sheet như "Top Worker Time Queries" (full statement text) hay "IO Stats By File" (20 cột) làm docx
+# build / save / mở trong Word rất chậm. Mỗi bảng có 1 ngân sách kích thước, vượt ngân sách thì:
+#   - bỏ bớt dòng cuối cho vừa max_cells / max_chars
+#   - text dài hơn max_text_len cắt thành snippet + mã "[#1a2b3c4d]" (sha1 của full text),
+#     full text dồn vào appendix (text trùng nhau chỉ ghi 1 lần)
+#   - bảng rộng hơn max_columns tách thành nhiều bảng, lặp lại key_columns ở đầu mỗi bảng
+# Giá trị trong config của placeholder ghi đè DEFAULT_TABLE_BUDGET; đặt None để tắt 1 giới hạn.
+# Không đặt max_text_len nhưng có max_chars: ô dài hơn max_chars / số cột vẫn bị cắt (chặn cứng), để 1 ô
+# vài MB không vượt ngân sách của cả bảng.
+# Nhờ vậy thời gian build và kích thước output luôn có giới hạn, dù sheet gốc lớn cỡ nào.
+
+DEFAULT_TABLE_BUDGET = {
+    "max_cells": 2000,           # số ô tối đa (dòng x cột)
+    "max_chars": 100000,         # tổng số ký tự tối đa của bảng (tính theo text sau khi cắt)
+    "max_text_len": None,        # text dài hơn -> snippet + ref tới appendix (bật theo từng placeholder)
+    "max_columns": None,         # bảng rộng hơn -> tách thành nhiều bảng
+    "key_columns": 1,            # số cột đầu (hoặc list tên cột) lặp lại ở mỗi bảng tách
+    "max_appendix_text": 20000,  # full text trong appendix cũng bị chặn
+}
+
+REF_PATTERN = re.compile(r"\[#([0-9a-f]{8})\]")
+REF_SUFFIX_LEN = len(" … [#12345678]")
+
+def budget_for(config):
+    budget = dict(DEFAULT_TABLE_BUDGET)
+    budget.update({key: config[key] for key in DEFAULT_TABLE_BUDGET if key in config})
+    return budget
+
+def text_ref(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+
+def _is_text(series):
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+# ==================== ROWS ====================
+def trim_rows(df, max_cells=None, max_chars=None, max_text_len=None):
+    """Số dòng giữ lại để bảng nằm trong max_cells / max_chars (luôn giữ ít nhất 1 dòng)."""
+    keep = len(df)
+    if max_cells and df.shape[1]:
+        keep = min(keep, max(1, max_cells // df.shape[1]))
+    if max_chars and keep:
+        lengths = df.head(keep).astype(str).apply(lambda s: s.str.len())
+        if max_text_len:
+            lengths = lengths.clip(upper=max_text_len + REF_SUFFIX_LEN)
+        row_chars = lengths.sum(axis=1).cumsum()
+        keep = max(1, int((row_chars <= max_chars).sum()))
+    return df.head(keep)
+
+# ==================== LONG TEXT ====================
+def truncate_long_text(df, max_len, title, appendix, max_appendix_text=None):
+    """
+    Cắt các ô text dài hơn max_len ký tự thành snippet + "[#ref]".
+    appendix: dict ref -> {"ref", "table", "column", "text"}, được bổ sung các full text bị cắt.
+    """
+    out = None
+    for j in range(df.shape[1]):
+        values = df.iloc[:, j]
+        if not _is_text(values):
+            continue
+        try:
+            long_mask = values.str.len() > max_len
+        except AttributeError:  # cột object nhưng không chứa string (vd: datetime)
+            continue
+        if not long_mask.any():
+            continue
+
+        column = str(df.columns[j])
+
+        def shorten(text):
+            compact = " ".join(text.split())
+            if len(compact) <= max_len:
+                return compact
+            ref = text_ref(text)
+            if ref not in appendix:
+                full = text
+                if max_appendix_text and len(full) > max_appendix_text:
+                    full = f"{full[:max_appendix_text]}\n… (đã cắt, còn {len(text) - max_appendix_text} ký tự)"
+                appendix[ref] = {"ref": ref, "table": title, "column": column, "text": full}
+            return f"{compact[:max_len].rstrip()} … [#{ref}]"
+
+        if out is None:
+            out = df.copy()
+        out.iloc[:, j] = values.where(~long_mask, values[long_mask].map(shorten))
+    return df if out is None else out
+
+# ==================== WIDE TABLES ====================
+def column_groups(columns, max_columns, key_columns=1):
+    """Chia vị trí cột thành các nhóm <= max_columns, mỗi nhóm bắt đầu bằng key columns. None nếu không cần tách."""
+    columns = list(columns)
+    if not max_columns or len(columns) <= max_columns:
+        return None
+    if isinstance(key_columns, int):
+        keys = list(range(min(key_columns, len(columns))))
+    else:
+        keys = [i for i, col in enumerate(columns) if col in key_columns]
+    # Mỗi bảng phải còn chỗ cho ít nhất 1 cột không phải key
+    keys = keys[:max(max_columns - 1, 0)]
+    rest = [i for i in range(len(columns)) if i not in keys]
+    per_part = max(1, max_columns - len(keys))
+    # Chia đều thay vì để bảng cuối chỉ còn 1-2 cột
+    size = math.ceil(len(rest) / math.ceil(len(rest) / per_part))
+    return [keys + rest[i:i + size] for i in range(0, len(rest), size)]
+
+def apply_table_budget(df, config, title, appendix):
+    """Áp ngân sách cho 1 bảng đã select. Trả về (df, extra) với extra bổ sung vào block của model."""
+    budget = budget_for(config)
+    total_rows = len(df)
+
+    text_len = budget["max_text_len"]
+    if not text_len and budget["max_chars"] and df.shape[1]:
+        # Chặn cứng: 1 dòng luôn nằm trong max_chars dù có ô rất dài
+        text_len = max(budget["max_chars"] // df.shape[1] - REF_SUFFIX_LEN, 1)
+
+    df = trim_rows(df, budget["max_cells"], budget["max_chars"], text_len)
+    if text_len:
+        df = truncate_long_text(df, text_len, title, appendix, budget["max_appendix_text"])
+
+    extra = {}
+    groups = column_groups(df.columns, budget["max_columns"], budget["key_columns"])
+    if groups:
+        extra["column_groups"] = groups
+    if len(df) < total_rows:
+        extra["note"] = f"Hiển thị {len(df)}/{total_rows} dòng (giới hạn kích thước bảng)."
+        print(f"✂️ {title}: {total_rows} -> {len(df)} rows (table budget)")
+    return df, extra
+
+def table_parts(block):
+    """[(df, config), ...] để writer dựng từng bảng; column_widths được map lại theo cột của từng phần."""
+    df, config = block["data"], block["config"]
+    groups = block.get("column_groups")
+    if not groups:
+        return [(df, config)]
+
+    parts = []
+    widths = config.get("column_widths")
+    for group in groups:
+        part_config = dict(config)
+        if widths:
+            part_config["column_widths"] = [widths[i] for i in group if i < len(widths)]
+        parts.append((df.iloc[:, group], part_config))
+    return parts
+
+# ==================== APPENDIX ====================
+def appendix_heading(entry):
+    return f"[#{entry['ref']}] {entry['table']} / {entry['column']}"
+
+def appendix_text(block):
+    """Nội dung file đính kèm (.txt) khi appendix để ngoài report."""
+    lines = [block["title"], "=" * len(block["title"]), ""]
+    for entry in block["entries"]:
+        lines += [appendix_heading(entry), entry["text"], ""]
+    return "\n".join(lines)
@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from datetime import datetime
+
+from merge_excel import merge_sql_csv
+from rpwithchart import generate_report, find_templates, DEFAULT_MAPPING, DEFAULT_CHART_MAPPING
+from rules_engine import DEFAULT_RULES
+from report_cache import TemplateCache
+
+# watchdog là tuỳ chọn: có thì dùng filesystem notification, không có thì quét định kỳ (polling)
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+# ==================== WATCH MODE ====================
+# Chạy liên tục, theo dõi input/<INSTANCE>/. Khi 1 instance có file mới và đã "yên" settle_sec giây
+# (không còn file đang copy dở), chỉ merge lại instance đó và render lại report của nó.
+# Mapping + rules và nội dung file template (bytes, qua TemplateCache) được giữ trong process. Template vẫn được
+# parse lại bằng Document() mỗi lần render (~10ms, xem stage template_load), không cache object đã parse.
+
+# File tạm của Explorer / robocopy / trình duyệt khi đang copy
+IGNORED_SUFFIXES = (".tmp", ".part", ".partial", ".crdownload", ".filepart")
+
+def _ignored(filename):
+    return filename.startswith("~$") or filename.lower().endswith(IGNORED_SUFFIXES)
+
+def snapshot_folder(folder):
+    """{tên file: (size, mtime)} của 1 folder instance, dùng để biết folder đã copy xong chưa."""
+    snap = {}
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file() and not _ignored(entry.name):
+                    st = entry.stat()
+                    snap[entry.name] = (st.st_size, st.st_mtime)
+    except FileNotFoundError:
+        pass
+    return snap
+
+class _DropEventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory and event.event_type == "modified":
+            return
+        for path in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+            if path:
+                self.watcher.mark_path(path)
+
+class CollectionWatcher:
+    def __init__(self, input_root, output_folder, template_folder, report_folder,
+                 mapping=None, chart_mapping=None, rules=None, settle_sec=3.0, poll_sec=1.0):
+        self.input_root = os.path.abspath(input_root)
+        self.output_folder = output_folder
+        self.template_folder = template_folder
+        self.report_folder = report_folder
+        self.mapping = mapping or DEFAULT_MAPPING
+        self.chart_mapping = chart_mapping or DEFAULT_CHART_MAPPING
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.settle_sec = settle_sec
+        self.poll_sec = poll_sec
+        self.templates = TemplateCache()
+
+        self._lock = threading.Lock()
+        self._dirty = {}       # instance -> thời điểm event cuối
+        self._snapshots = {}   # instance -> snapshot lần kiểm tra trước
+
+    # ---------- phát hiện thay đổi ----------
+    def mark_instance(self, instance):
+        with self._lock:
+            self._dirty[instance] = time.monotonic()
+
+    def mark_path(self, path):
+        rel = os.path.relpath(os.path.abspath(path), self.input_root)
+        parts = rel.split(os.sep)
+        if rel.startswith("..") or len(parts) < 2 or _ignored(parts[-1]):
+            return
+        self.mark_instance(parts[0])
+
+    def _instances(self):
+        return sorted(d for d in os.listdir(self.input_root) if os.path.isdir(os.path.join(self.input_root, d)))
+
+    def _poll_changes(self):
+        """Fallback khi không có watchdog: so snapshot từng folder với lần quét trước."""
+        for instance in self._instances():
+            snap = snapshot_folder(os.path.join(self.input_root, instance))
+            if snap != self._snapshots.get(instance):
+                self._snapshots[instance] = snap
+                self.mark_instance(instance)
+
+    def _excel_file(self, instance):
+        return os.path.join(self.output_folder, f"{instance}_healthcheck_info.xlsx")
+
+    def seed_snapshots(self):
+        """Ghi nhận trạng thái hiện tại của input, để lần poll đầu chỉ thấy thay đổi sau khi khởi động."""
+        for instance in self._instances():
+            self._snapshots[instance] = snapshot_folder(os.path.join(self.input_root, instance))
+
+    def catch_up(self):
+        """Lúc khởi động: instance nào có input mới hơn file Excel đã merge thì xử lý luôn."""
+        self.seed_snapshots()
+        for instance in self._instances():
+            snap = self._snapshots[instance]
+            excel_file = self._excel_file(instance)
+            newest_input = max((mtime for _, mtime in snap.values()), default=0)
+            if not os.path.exists(excel_file) or os.path.getmtime(excel_file) < newest_input:
+                self.mark_instance(instance)
+
+    def _ready_instances(self):
+        """Instance đã qua settle_sec từ event cuối và snapshot không đổi (copy xong)."""
+        now = time.monotonic()
+        with self._lock:
+            due = [inst for inst, last in self._dirty.items() if now - last >= self.settle_sec]
+
+        ready = []
+        for instance in due:
+            snap = snapshot_folder(os.path.join(self.input_root, instance))
+            if not snap and not self._snapshots.get(instance):
+                # Folder bị xoá / rỗng qua 1 chu kỳ settle -> không có gì để merge, thôi theo dõi
+                with self._lock:
+                    self._dirty.pop(instance, None)
+                if os.path.isdir(os.path.join(self.input_root, instance)):
+                    self._snapshots[instance] = snap  # folder rỗng: giữ snapshot để lần poll sau không mark lại
+                else:
+                    self._snapshots.pop(instance, None)
+                continue
+            if snap and snap == self._snapshots.get(instance):
+                ready.append(instance)
+                with self._lock:
+                    self._dirty.pop(instance, None)
+            else:
+                # Vẫn đang thay đổi -> chờ thêm 1 chu kỳ settle
+                self._snapshots[instance] = snap
+                self.mark_instance(instance)
+        return ready
+
+    # ---------- xử lý ----------
+    def process_instance(self, instance):
+        started = time.perf_counter()
+        print(f"\n🚀 [{datetime.now():%H:%M:%S}] Drop mới cho {instance}, merge + render lại")
+        os.makedirs(self.output_folder, exist_ok=True)
+        os.makedirs(self.report_folder, exist_ok=True)
+
+        excel_file = self._excel_file(instance)
+        merge_sql_csv(os.path.join(self.input_root, instance), excel_file)
+        if not os.path.exists(excel_file):
+            return
+
+        templates = find_templates(self.template_folder, os.path.basename(excel_file))
+        if not templates:
+            print(f"⚠️ Không tìm thấy template cho {instance}")
+        for template_file in templates:
+            generate_report(
+                excel_file=excel_file,
+                template_file=self.templates.get(os.path.join(self.template_folder, template_file)),
+                output_file=os.path.join(self.report_folder, template_file),
+                mapping=self.mapping,
+                chart_mapping=self.chart_mapping,
+                rules=self.rules
+            )
+        print(f"⏱️ {instance}: report sẵn sàng sau {time.perf_counter() - started:.1f}s")
+
+    def run(self, catch_up=True):
+        if catch_up:
+            self.catch_up()
+        else:
+            self.seed_snapshots()
+
+        observer = None
+        if Observer is not None:
+            observer = Observer()
+            observer.schedule(_DropEventHandler(self), self.input_root, recursive=True)
+            observer.start()
+            print(f"👀 Watching {self.input_root} (watchdog, settle {self.settle_sec}s)")
+        else:
+            print(f"👀 Watching {self.input_root} (polling mỗi {self.poll_sec}s, settle {self.settle_sec}s)")
+
+        try:
+            while True:
+                if observer is None:
+                    self._poll_changes()
+                for instance in self._ready_instances():
+                    try:
+                        self.process_instance(instance)
+                    except Exception as e:
+                        print(f"❌ Lỗi xử lý {instance}: {e}")
+                time.sleep(self.poll_sec)
+        except KeyboardInterrupt:
+            print("\n🛑 Dừng watch mode")
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+def main(argv=None):
+    base = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Tự merge + render report khi collection mới được copy vào input/")
+    parser.add_argument("--input", default=os.path.join(base, "input"))
+    parser.add_argument("--output", default=os.path.join(base, "output"))
+    parser.add_argument("--templates", default=os.path.join(base, "rptemplate"))
+    parser.add_argument("--reports", default=os.path.join(base, "reports"))
+    parser.add_argument("--settle-sec", type=float, default=3.0, help="Số giây không có thay đổi thì coi là copy xong")
+    parser.add_argument("--poll-sec", type=float, default=1.0)
+    parser.add_argument("--no-catch-up", action="store_true", help="Không xử lý các instance cũ lúc khởi động")
+    args = parser.parse_args(argv)
+
+    watcher = CollectionWatcher(args.input, args.output, args.templates, args.reports,
+                                settle_sec=args.settle_sec, poll_sec=args.poll_sec)
+    watcher.run(catch_up=not args.no_catch_up)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,424 @@
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import threading
+import traceback
+import multiprocessing
+import pandas as pd
+from datetime import datetime
+
+from merge_excel import merge_sql_csv
+from rpwithchart import generate_report, find_templates, DEFAULT_MAPPING, DEFAULT_CHART_MAPPING
+from rules_engine import evaluate_fleet, summarize_findings, DEFAULT_RULES
+
+# ==================== SHARED-DIRECTORY WORK QUEUE ====================
+# Hàng đợi task chỉ dùng 1 folder chung (ổ share / NFS / SMB), không cần service mạng.
+# Dùng file + os.rename (atomic) thay vì SQLite vì SQLite lock không tin cậy trên ổ mạng.
+#
+# queue_dir/
+#   job.json                    cấu hình chung (folder input/output/reports/template, lease, retry)
+#   pending/<task_id>.json      chờ xử lý
+#   running/<task_id>.json      đang chạy; mtime = heartbeat, quá lease_sec -> trả về pending
+#                               worker + claimed_at trong file là "claim": chỉ đúng chủ claim mới được move/touch
+#   done/<task_id>.json
+#   failed/<task_id>.json       hết số lần retry
+#   summary.json                kết quả bước aggregate
+#   archive/<created_at>/       done/failed/summary của lần init trước
+#
+# Task "merge" (1 instance) xong sẽ tự enqueue task "render" cho các template khớp instance đó.
+
+STATES = ["pending", "running", "done", "failed"]
+
+def _state_dir(queue_dir, state):
+    return os.path.join(queue_dir, state)
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def load_job(queue_dir):
+    return _read_json(os.path.join(queue_dir, "job.json"))
+
+# ==================== ENQUEUE ====================
+def enqueue(queue_dir, task):
+    """Thêm task vào pending. Bỏ qua nếu task_id đã có ở bất kỳ trạng thái nào."""
+    filename = f"{task['id']}.json"
+    for state in STATES:
+        if os.path.exists(os.path.join(_state_dir(queue_dir, state), filename)):
+            return False
+    task.setdefault("attempts", 0)
+    task.setdefault("errors", [])
+    _write_json_atomic(os.path.join(_state_dir(queue_dir, "pending"), filename), task)
+    return True
+
+def init_queue(queue_dir, input_root, output_folder, report_folder, template_folder,
+               lease_sec=300, max_attempts=3):
+    """
+    Tạo queue mới và enqueue 1 task merge cho mỗi folder instance trong input_root.
+    Init lại trên queue cũ (vd: đợt quý sau): done/failed/summary của lần trước được chuyển vào archive/,
+    nếu không enqueue sẽ bỏ qua các task_id đã done và worker aggregate ra kết quả cũ.
+    """
+    archive_previous_run(queue_dir)
+    for state in STATES:
+        os.makedirs(_state_dir(queue_dir, state), exist_ok=True)
+    if os.path.exists(os.path.join(queue_dir, "aggregate.lock")):
+        os.remove(os.path.join(queue_dir, "aggregate.lock"))
+
+    job = {
+        "input_root": os.path.abspath(input_root),
+        "output_folder": os.path.abspath(output_folder),
+        "report_folder": os.path.abspath(report_folder),
+        "template_folder": os.path.abspath(template_folder),
+        "lease_sec": lease_sec,
+        "max_attempts": max_attempts,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    _write_json_atomic(os.path.join(queue_dir, "job.json"), job)
+
+    count = 0
+    for sub in sorted(os.listdir(input_root)):
+        if os.path.isdir(os.path.join(input_root, sub)):
+            count += enqueue(queue_dir, {"id": f"merge-{sub}", "kind": "merge", "instance": sub})
+    print(f"📥 Đã enqueue {count} task merge vào {queue_dir}")
+    return count
+
+def archive_previous_run(queue_dir):
+    """Chuyển done/, failed/, summary.json của lần chạy trước vào archive/<created_at>/."""
+    job_file = os.path.join(queue_dir, "job.json")
+    if not os.path.exists(job_file):
+        return None
+    run_id = _read_json(job_file).get("created_at", "previous").replace(":", "")
+    archive_dir = os.path.join(queue_dir, "archive", run_id)
+    suffix = 2
+    while os.path.exists(archive_dir):
+        archive_dir = os.path.join(queue_dir, "archive", f"{run_id}-{suffix}")
+        suffix += 1
+
+    moved = 0
+    for name in ("done", "failed", "summary.json"):
+        path = os.path.join(queue_dir, name)
+        if os.path.exists(path) and (not os.path.isdir(path) or os.listdir(path)):
+            os.makedirs(archive_dir, exist_ok=True)
+            shutil.move(path, os.path.join(archive_dir, name))
+            moved += 1
+    if moved:
+        print(f"🗄️ Đã archive kết quả lần chạy trước vào {archive_dir}")
+    return archive_dir if moved else None
+
+# ==================== CLAIM / LEASE ====================
+def claim_task(queue_dir, worker_id):
+    """Lấy 1 task pending bằng os.rename (chỉ 1 worker rename thành công). Trả về (task, path) hoặc None."""
+    pending_dir = _state_dir(queue_dir, "pending")
+    for filename in sorted(os.listdir(pending_dir)):
+        if not filename.endswith(".json"):
+            continue
+        running_path = os.path.join(_state_dir(queue_dir, "running"), filename)
+        try:
+            os.rename(os.path.join(pending_dir, filename), running_path)
+        except OSError:
+            continue  # worker khác đã lấy
+
+        try:
+            # rename giữ mtime cũ của file pending -> touch ngay để reaper không coi là hết lease
+            os.utime(running_path)
+            task = _read_json(running_path)
+        except (OSError, ValueError):
+            continue  # đã bị reap ngay sau khi rename
+        task["worker"] = worker_id
+        task["claimed_at"] = time.time()
+        _write_json_atomic(running_path, task)  # ghi mới -> mtime = bắt đầu lease
+        return task, running_path
+    return None
+
+def task_claim(task):
+    """Fencing token của 1 lần claim: (worker, claimed_at)."""
+    return task.get("worker"), task.get("claimed_at")
+
+class LeaseHeartbeat(threading.Thread):
+    """Định kỳ touch file running để gia hạn lease trong lúc task đang chạy (chỉ khi file vẫn là claim của mình)."""
+
+    def __init__(self, path, lease_sec, claim):
+        super().__init__(daemon=True)
+        self.path = path
+        self.claim = claim
+        self.interval = max(lease_sec / 3, 1)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if task_claim(_read_json(self.path)) != self.claim:
+                    return  # đã bị reap và worker khác claim lại -> không gia hạn lease của họ
+                os.utime(self.path)
+            except (OSError, ValueError):
+                continue  # file đang được rename tạm (reaper kiểm tra claim), thử lại chu kỳ sau
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def _move_task(queue_dir, running_path, task, state, tag, claim):
+    """
+    Move task từ running sang state với nội dung mới.
+    Rename sang tên tạm trước (atomic) để không đụng worker/reaper khác, rồi kiểm tra file vẫn là đúng claim
+    (worker, claimed_at); khác claim (đã bị reap + claim lại) thì rename trả lại. False nếu không move được.
+    """
+    filename = os.path.basename(running_path)
+    holding_path = f"{running_path}.{tag}"
+    try:
+        os.rename(running_path, holding_path)
+    except OSError:
+        return False
+    try:
+        current = task_claim(_read_json(holding_path))
+    except (OSError, ValueError):
+        current = None
+    if current != claim:
+        os.rename(holding_path, running_path)
+        return False
+    _write_json_atomic(holding_path, task)
+    os.replace(holding_path, os.path.join(_state_dir(queue_dir, state), filename))
+    return True
+
+def _retry_or_fail(task, max_attempts, error):
+    task["attempts"] = task.get("attempts", 0) + 1
+    task.setdefault("errors", []).append(error)
+    task.pop("worker", None)
+    task.pop("claimed_at", None)
+    return "failed" if task["attempts"] >= max_attempts else "pending"
+
+def reap_expired(queue_dir, lease_sec, max_attempts, worker_id):
+    """Task running quá lease (worker chết / mất mạng) -> trả về pending hoặc failed."""
+    running_dir = _state_dir(queue_dir, "running")
+    now = time.time()
+    reaped = 0
+    for filename in os.listdir(running_dir):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(running_dir, filename)
+        try:
+            if now - os.path.getmtime(path) <= lease_sec:
+                continue
+            task = _read_json(path)
+        except (OSError, ValueError):
+            continue  # vừa bị move / đang ghi dở
+        # Lease tính từ heartbeat (mtime) hoặc claimed_at do worker ghi, lấy mốc mới hơn
+        if now - task.get("claimed_at", 0) <= lease_sec:
+            continue
+
+        claim = task_claim(task)
+        state = _retry_or_fail(task, max_attempts, f"lease expired (worker {task.get('worker')})")
+        if _move_task(queue_dir, path, task, state, f"reap-{worker_id}", claim):
+            print(f"   ♻️ Reaped {task['id']} -> {state}")
+            reaped += 1
+    return reaped
+
+def queue_counts(queue_dir):
+    # Tính cả file đang reap/finish (tên *.json.<tag>), bỏ file .tmp của _write_json_atomic
+    return {state: sum(1 for f in os.listdir(_state_dir(queue_dir, state)) if not f.endswith(".tmp"))
+            for state in STATES}
+
+def queue_idle(queue_dir):
+    # Kiểm tra 2 lần: task có thể đang chuyển giữa pending và running đúng lúc listdir
+    for _ in range(2):
+        counts = queue_counts(queue_dir)
+        if counts["pending"] or counts["running"]:
+            return False
+    return True
+
+# ==================== TASK EXECUTION ====================
+def excel_path(job, instance):
+    return os.path.join(job["output_folder"], f"{instance}_healthcheck_info.xlsx")
+
+def run_task(queue_dir, job, task):
+    if task["kind"] == "merge":
+        instance = task["instance"]
+        os.makedirs(job["output_folder"], exist_ok=True)
+        excel_file = excel_path(job, instance)
+        merge_sql_csv(os.path.join(job["input_root"], instance), excel_file)
+        if not os.path.exists(excel_file):
+            return  # instance không có CSV
+
+        # Enqueue render cho các template khớp instance (cùng quy tắc keyword với rpwithchart.py)
+        for template_file in find_templates(job["template_folder"], os.path.basename(excel_file)):
+            enqueue(queue_dir, {"id": f"render-{os.path.splitext(template_file)[0]}", "kind": "render",
+                                "instance": instance, "template": template_file})
+        return
+
+    if task["kind"] == "render":
+        os.makedirs(job["report_folder"], exist_ok=True)
+        generate_report(
+            excel_file=excel_path(job, task["instance"]),
+            template_file=os.path.join(job["template_folder"], task["template"]),
+            output_file=os.path.join(job["report_folder"], task["template"]),
+            mapping=DEFAULT_MAPPING,
+            chart_mapping=DEFAULT_CHART_MAPPING,
+            rules=DEFAULT_RULES
+        )
+        return
+
+    raise ValueError(f"Unknown task kind: {task['kind']}")
+
+def run_worker(queue_dir, worker_id=None, exit_when_idle=True, poll_sec=1.0):
+    """Vòng lặp worker: reap lease hết hạn -> claim -> chạy -> done / retry / failed."""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    job = load_job(queue_dir)
+    processed = 0
+    print(f"👷 Worker {worker_id} bắt đầu")
+
+    while True:
+        reap_expired(queue_dir, job["lease_sec"], job["max_attempts"], worker_id)
+        claimed = claim_task(queue_dir, worker_id)
+        if claimed is None:
+            if exit_when_idle and queue_idle(queue_dir):
+                break
+            time.sleep(poll_sec)
+            continue
+
+        task, running_path = claimed
+        print(f"   ▶️ {worker_id}: {task['id']} (attempt {task.get('attempts', 0) + 1})")
+        claim = task_claim(task)
+        heartbeat = LeaseHeartbeat(running_path, job["lease_sec"], claim)
+        heartbeat.start()
+        try:
+            started = time.perf_counter()
+            run_task(queue_dir, job, task)
+            task["duration_sec"] = round(time.perf_counter() - started, 3)
+            state = "done"
+        except Exception as e:
+            traceback.print_exc()
+            state = _retry_or_fail(task, job["max_attempts"], f"{type(e).__name__}: {e}")
+        finally:
+            heartbeat.stop()
+
+        if _move_task(queue_dir, running_path, task, state, f"finish-{worker_id}", claim):
+            print(f"   {'✅' if state == 'done' else '⚠️'} {worker_id}: {task['id']} -> {state}")
+        else:
+            print(f"   ⚠️ {worker_id}: {task['id']} đã bị reap trong lúc chạy, bỏ kết quả")
+        processed += 1
+
+    print(f"👷 Worker {worker_id} dừng ({processed} task)")
+    if exit_when_idle:
+        aggregate(queue_dir)
+    return processed
+
+# ==================== AGGREGATE ====================
+def aggregate(queue_dir):
+    """
+    Bước cuối khi queue rỗng: ghi summary.json + fleet_findings.xlsx.
+    Dùng file lock O_EXCL nên dù nhiều worker gọi cùng lúc thì chỉ chạy 1 lần.
+    """
+    if not queue_idle(queue_dir):
+        print("⏳ Queue chưa xong, chưa aggregate")
+        return False
+    if os.path.exists(os.path.join(queue_dir, "summary.json")):
+        return False  # đã aggregate xong (worker khác)
+
+    lock_path = os.path.join(queue_dir, "aggregate.lock")
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.close(fd)
+    except FileExistsError:
+        # Có thể worker khác vừa aggregate xong trong lúc này
+        if not os.path.exists(os.path.join(queue_dir, "summary.json")):
+            print(f"⏭️ Bỏ qua aggregate: đã có {lock_path} (worker khác đang aggregate, "
+                  "hoặc lần trước bị dừng giữa chừng -> xoá file này rồi chạy lại)")
+        return False
+
+    try:
+        _aggregate(queue_dir)
+    except Exception as e:
+        # Bỏ lock để lần gọi sau chạy lại được
+        os.remove(lock_path)
+        print(f"❌ Aggregate lỗi: {type(e).__name__}: {e}")
+        traceback.print_exc()
+        return False
+    return True
+
+def _aggregate(queue_dir):
+    job = load_job(queue_dir)
+    summary = {"counts": queue_counts(queue_dir), "failed": [], "finished_at": None}
+    for filename in sorted(os.listdir(_state_dir(queue_dir, "failed"))):
+        if filename.endswith(".json"):
+            task = _read_json(os.path.join(_state_dir(queue_dir, "failed"), filename))
+            summary["failed"].append({"id": task["id"], "errors": task.get("errors", [])})
+
+    findings = evaluate_fleet(job["output_folder"], DEFAULT_RULES)
+    findings_file = os.path.join(job["report_folder"], "fleet_findings.xlsx")
+    os.makedirs(job["report_folder"], exist_ok=True)
+    with pd.ExcelWriter(findings_file, engine="openpyxl") as writer:
+        summarize_findings(findings).to_excel(writer, sheet_name="Summary", index=False)
+        findings.to_excel(writer, sheet_name="Findings", index=False)
+    summary["findings_file"] = findings_file
+    summary["finished_at"] = datetime.now().isoformat(timespec="seconds")
+
+    _write_json_atomic(os.path.join(queue_dir, "summary.json"), summary)
+    print(f"📊 Aggregate xong: {summary['counts']}, failed={len(summary['failed'])}")
+
+# ==================== LOCAL MODE ====================
+def run_local(queue_dir, workers=4):
+    """Chạy nhiều worker process trên cùng 1 máy (để test trước khi chia ra nhiều host)."""
+    processes = [multiprocessing.Process(target=run_worker, args=(queue_dir, f"{socket.gethostname()}-w{i}"))
+                 for i in range(workers)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    aggregate(queue_dir)  # phòng trường hợp worker cuối bị kill trước khi aggregate
+    return queue_counts(queue_dir)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Phân phối merge/render qua work queue trên folder chung")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_init = sub.add_parser("init", help="Tạo queue và enqueue task merge cho mỗi instance")
+    p_init.add_argument("--queue", required=True)
+    p_init.add_argument("--input", required=True)
+    p_init.add_argument("--output", required=True)
+    p_init.add_argument("--reports", required=True)
+    p_init.add_argument("--templates", required=True)
+    p_init.add_argument("--lease-sec", type=int, default=300)
+    p_init.add_argument("--max-attempts", type=int, default=3)
+
+    p_worker = sub.add_parser("worker", help="Chạy 1 worker (mỗi host có thể chạy nhiều)")
+    p_worker.add_argument("--queue", required=True)
+    p_worker.add_argument("--id", default=None)
+    p_worker.add_argument("--forever", action="store_true", help="Không thoát khi queue rỗng")
+
+    p_local = sub.add_parser("local", help="Chạy N worker process trên máy này")
+    p_local.add_argument("--queue", required=True)
+    p_local.add_argument("--workers", type=int, default=4)
+
+    p_agg = sub.add_parser("aggregate", help="Chạy bước aggregate (khi queue đã xong)")
+    p_agg.add_argument("--queue", required=True)
+
+    p_status = sub.add_parser("status", help="Đếm task theo trạng thái")
+    p_status.add_argument("--queue", required=True)
+
+    args = parser.parse_args(argv)
+    if args.command == "init":
+        init_queue(args.queue, args.input, args.output, args.reports, args.templates,
+                   lease_sec=args.lease_sec, max_attempts=args.max_attempts)
+    elif args.command == "worker":
+        run_worker(args.queue, args.id, exit_when_idle=not args.forever)
+    elif args.command == "local":
+        print(run_local(args.queue, args.workers))
+    elif args.command == "aggregate":
+        aggregate(args.queue)
+    elif args.command == "status":
+        print(queue_counts(args.queue))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())